@@ -0,0 +1,143 @@
+from binascii import unhexlify
+from random import randint
+from io import BytesIO
+from statistics import mean, pstdev
+from time import perf_counter
+
+import tracemalloc
+
+import ecc
+from ecc import G, N, P, PrivateKey, S256Point, jacobian_to_affine
+from helper import SIGHASH_ALL, decode_base58, p2pkh_script
+from tx import Tx, TxIn, TxOut
+
+
+def time_each(func, args):
+    '''Returns how long func took on each of args, in seconds'''
+    timings = []
+    for arg in args:
+        start = perf_counter()
+        func(arg)
+        timings.append(perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    print('{:<40} {:>8.3f} ms  (stdev {:.3f} ms)'.format(
+        name, mean(timings) * 1000, pstdev(timings) * 1000))
+
+
+def bench_glv(number=100):
+    '''Compares the wNAF and GLV paths of __rmul__'''
+    point = S256Point.parse(
+        unhexlify('0349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278a'))
+    coefficients = [randint(1, N) for _ in range(number)]
+    S256Point.use_glv = False
+    report('k*P (wNAF)', time_each(lambda k: (k*point).x, coefficients))
+    S256Point.use_glv = True
+    report('k*P (GLV)', time_each(lambda k: (k*point).x, coefficients))
+    S256Point.use_glv = False
+    point = S256Point(point.x, point.y)
+    point.precompute()
+    report('k*P (wNAF, precomputed table)', time_each(lambda k: (k*point).x, coefficients))
+
+
+def bench_ladder(number=100):
+    '''Compares the variable-time paths with the Montgomery ladder. The
+    coefficients mix random scalars with very sparse and very dense ones,
+    so the stdev shows how much the time depends on the scalar
+    '''
+    point = 1485*G
+    coefficients = [randint(1, N) for _ in range(number)]
+    coefficients += [2**i for i in range(0, 256, 256 // number)]
+    coefficients += [2**256 - 2**i - 1 for i in range(0, 256, 256 // number)]
+    report('k*G (precomputed table)', time_each(lambda k: (k*G).x, coefficients))
+    report('k*P (variable time)', time_each(lambda k: (k*point).x, coefficients))
+    report('k*G (ladder)', time_each(lambda k: G.ladder_mul(k).x, coefficients))
+    report('k*P (ladder)', time_each(lambda k: point.ladder_mul(k).x, coefficients))
+
+
+def bench_kernels(number=1000):
+    '''Compares plain ints with the kernel ecc picked at import time on
+    the operations field arithmetic is built from
+    '''
+    if ecc.gmpy2 is None:
+        print('gmpy2 is not installed, only the int kernel is available')
+    kernels = [('int', int, pow, lambda a, m: pow(a, m - 2, m))]
+    if ecc.gmpy2 is not None:
+        kernels.append(('gmpy2', ecc.gmpy2.mpz, ecc.gmpy2.powmod, ecc.gmpy2.invert))
+    values = [randint(1, P - 1) for _ in range(number)]
+    point = (1485*G).jacobian()
+    for name, to_num, powmod, invert in kernels:
+        nums = [to_num(v) for v in values]
+        pairs = list(zip(nums, reversed(nums)))
+        report('mul mod p ({})'.format(name),
+               time_each(lambda ab: ab[0] * ab[1] % P, pairs))
+        report('pow mod p ({})'.format(name),
+               time_each(lambda a: powmod(a, (P + 1) // 4, P), nums))
+        report('invert mod p ({})'.format(name),
+               time_each(lambda a: invert(a, P), nums))
+        # the Jacobian formulas are written with operators only, so the
+        # same code runs on either integer type
+        start = S256Point.from_jacobian(tuple(to_num(c) for c in point))
+        report('k*P ({})'.format(name),
+               time_each(lambda k: jacobian_to_affine(
+                   S256Point.multi_mul([(k, start)]).jacobian()),
+                   values[:number // 10]))
+
+
+def bench_verify_parallel(inputs=200, processes=(1, 2, 4)):
+    '''Times verifying every input of one transaction serially and with
+    pools of worker processes'''
+    private_key = PrivateKey(secret=8675309)
+    prev_tx = unhexlify('0025bc3c0fa8b7eb55b9437fdbd016870d18e0df0ace7bc9864efc38414147c8')
+    tx_ins = [TxIn(prev_tx, 0, b'', i) for i in range(inputs)]
+    h160 = decode_base58('mzx5YhAH9kNHtcN481u6WkjeHjYtVeKVh2')
+    tx_outs = [TxOut(1000, p2pkh_script(h160))]
+    tx = Tx(1, tx_ins, tx_outs, 0, testnet=True)
+    for i in range(inputs):
+        # Script.type only recognises 71 to 73 byte signatures, so bump the
+        # sequence when a shorter one comes out
+        while True:
+            try:
+                tx.sign_input(i, private_key, SIGHASH_ALL)
+                break
+            except RuntimeError:
+                tx_ins[i].sequence += inputs
+    report('verify {} inputs (serial)'.format(inputs),
+           time_each(lambda _: tx.verify(), range(3)))
+    for n in processes:
+        report('verify {} inputs ({} processes)'.format(inputs, n),
+               time_each(lambda _: tx.verify(parallel=n), range(3)))
+
+
+def bench_memory(number=10000):
+    '''Reports the memory held per parsed transaction, before and after
+    its scripts are decoded. Only uses Tx.parse, so it can be run against
+    older revisions to compare'''
+    raw_tx = unhexlify('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
+    stream = BytesIO(raw_tx * number)
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        txs = [Tx.parse(stream) for _ in range(number)]
+        parsed = tracemalloc.get_traced_memory()[0] - start
+        for tx in txs:
+            for tx_in in tx.tx_ins:
+                tx_in.script_sig
+            for tx_out in tx.tx_outs:
+                tx_out.script_pubkey
+        decoded = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    print('{:<40} {:>8} bytes'.format('wire size', len(raw_tx)))
+    print('{:<40} {:>8.0f} bytes'.format('per parsed tx', parsed / number))
+    print('{:<40} {:>8.0f} bytes'.format('per parsed tx, scripts decoded', decoded / number))
+
+
+if __name__ == '__main__':
+    bench_glv()
+    bench_ladder()
+    bench_kernels()
+    bench_verify_parallel()
+    bench_memory()
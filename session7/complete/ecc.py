@@ -1,21 +1,78 @@
 from binascii import hexlify, unhexlify
-from io import BytesIO
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from random import randint
-from unittest import TestCase, skip
-
-from helper import encode_base58, encode_base58_checksum, hash160, double_sha256
+from unittest import TestCase, skip, skipUnless
+
+import hashlib
+import hmac
+
+try:
+    import coincurve
+except ImportError:
+    coincurve = None
+try:
+    import gmpy2
+except ImportError:
+    gmpy2 = None
+
+from helper import (
+    double_sha256,
+    encode_base58,
+    encode_base58_checksum,
+    h160_to_p2pkh_address,
+    hash160,
+)
+
+
+# The modular arithmetic kernel is picked at import time. With gmpy2
+# installed, field elements hold GMP integers and exponentiation and
+# inversion go through GMP, otherwise plain ints and the built-in pow.
+# Everything else is written with operators that work for both.
+if gmpy2 is None:
+    KERNEL = 'int'
+    to_num = int
+
+    def powmod(base, exponent, modulus):
+        return pow(base, exponent, modulus)
+
+    def invert(a, modulus):
+        '''inverse of a modulo a prime modulus'''
+        # pow would quietly return 0, gmpy2.invert raises
+        if a % modulus == 0:
+            raise ZeroDivisionError('0 has no inverse')
+        return pow(a, modulus - 2, modulus)
+else:
+    KERNEL = 'gmpy2'
+    to_num = gmpy2.mpz
+    powmod = gmpy2.powmod
+    invert = gmpy2.invert
 
 
 class FieldElement:
+    # no per-instance __dict__, field elements are created by the million
+    __slots__ = ('num', 'prime')
 
     def __init__(self, num, prime):
-        self.num = num
+        self.num = to_num(num)
         self.prime = prime
         if self.num >= self.prime or self.num < 0:
             error = 'Num {} not in field range 0 to {}'.format(
                 self.num, self.prime-1)
             raise RuntimeError(error)
 
+    @classmethod
+    def _new(cls, num, prime):
+        '''creates an element without the range check. Only for values we
+        computed ourselves and have already reduced mod prime
+        '''
+        element = object.__new__(cls)
+        element.num = num
+        element.prime = prime
+        return element
+
     def __eq__(self, other):
         if other is None:
             return False
@@ -31,28 +88,28 @@ class FieldElement:
 
     def __add__(self, other):
         num = (self.num + other.num) % self.prime
-        return self.__class__(num=num, prime=self.prime)
+        return self._new(num, self.prime)
 
     def __sub__(self, other):
         num = (self.num - other.num) % self.prime
-        return self.__class__(num=num, prime=self.prime)
+        return self._new(num, self.prime)
 
     def __mul__(self, other):
         num = (self.num * other.num) % self.prime
-        return self.__class__(num=num, prime=self.prime)
+        return self._new(num, self.prime)
 
     def __rmul__(self, coefficient):
         num = (self.num * coefficient) % self.prime
-        return self.__class__(num=num, prime=self.prime)
+        return self._new(num, self.prime)
 
     def __pow__(self, n):
         n = n % (self.prime - 1)
-        num = pow(self.num, n, self.prime)
-        return self.__class__(num=num, prime=self.prime)
+        num = powmod(self.num, n, self.prime)
+        return self._new(num, self.prime)
 
     def __truediv__(self, other):
-        other_inv = pow(other.num, self.prime - 2, self.prime)
-        return self*self.__class__(num=other_inv, prime=self.prime)
+        other_inv = invert(other.num, self.prime)
+        return self._new(self.num * other_inv % self.prime, self.prime)
 
 
 class FieldElementTest(TestCase):
@@ -90,6 +147,14 @@ class FieldElementTest(TestCase):
         b = FieldElement(18, 31)
         self.assertEqual(a**5 * b, FieldElement(16, 31))
 
+    def test_new(self):
+        a = FieldElement(3, 31)
+        self.assertEqual(FieldElement._new(3, 31), a)
+        self.assertEqual(type(S256Field._new(3, P)), S256Field)
+        self.assertEqual(type(S256Field(3) + S256Field(4)), S256Field)
+        with self.assertRaises(AttributeError):
+            a.extra = 1
+
     def test_div(self):
         a = FieldElement(3, 31)
         b = FieldElement(24, 31)
@@ -100,6 +165,28 @@ class FieldElementTest(TestCase):
         b = FieldElement(11, 31)
         self.assertEqual(a**-4*b, FieldElement(13, 31))
 
+    def test_kernel(self):
+        self.assertEqual(KERNEL, 'int' if gmpy2 is None else 'gmpy2')
+        self.assertEqual(type(FieldElement(3, 31).num), type(to_num(3)))
+        self.assertEqual(powmod(to_num(17), 3, 31), 15)
+        self.assertEqual(invert(to_num(24), 31), 22)
+        # zero has no inverse, whichever kernel is in use
+        for zero in (0, 31):
+            with self.assertRaises(ZeroDivisionError):
+                invert(to_num(zero), 31)
+        with self.assertRaises(ZeroDivisionError):
+            FieldElement(3, 31) / FieldElement(0, 31)
+        for _ in range(10):
+            a = randint(1, P-1)
+            self.assertEqual(invert(to_num(a), P) * a % P, 1)
+            self.assertEqual(powmod(to_num(a), P-1, P), 1)
+        # results come back as plain ints at the byte and signature edges
+        point = S256Point.from_jacobian(
+            tuple(to_num(c) for c in (12345*G).jacobian()))
+        self.assertEqual(point.sec(), (12345*G).sec())
+        sig = PrivateKey(12345).sign(1)
+        self.assertEqual((type(sig.r), type(sig.s)), (int, int))
+
 
 class Point:
 
@@ -306,9 +393,19 @@ A = 0
 B = 7
 P = 2**256 - 2**32 - 977
 N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+# secp256k1 has an endomorphism (x, y) -> (BETA*x, y) which is the same as
+# multiplying by LAMBDA. (A1, B1) and (A2, B2) are a short basis of the
+# lattice of (k1, k2) with k1 + k2*LAMBDA = 0 mod N, used by glv_split.
+BETA = 0x7AE96A2B657C07106E64479EAC3434E99CF0497512F58995C1396C28719501EE
+LAMBDA = 0x5363AD4CC05C30E0A5261C028812645A122E22EA20816678DF02967C1B23BD72
+A1 = 0x3086D221A7D46BCDE86C90E49284EB15
+B1 = -0xE4437ED6010E88286F547FA90ABFE4C3
+A2 = 0x114CA50F7A8E2F3F657C1108D9D44CFD8
+B2 = A1
 
 
 class S256Field(FieldElement):
+    __slots__ = ()
 
     def __init__(self, num, prime=None):
         super().__init__(num=num, prime=P)
@@ -320,20 +417,328 @@ class S256Field(FieldElement):
         return self.hex()
 
     def sqrt(self):
-        return self**((P+1)//4)
+        '''returns self^((P+1)/4), which is a square root of self when self
+        is a square. Uses a fixed addition chain for the exponent
+        '''
+        x2, x3, x22, x223 = s256_chain(self.num)
+        # (P+1)/4 is 223 ones, a zero, 22 ones, 0b000011 and then 0b00
+        t = square_n(x223, 23) * x22 % P
+        t = square_n(t, 6) * x2 % P
+        return self._new(square_n(t, 2), P)
+
+    def is_square(self):
+        '''returns whether self has a square root in the field, using
+        Euler's criterion self^((P-1)/2) with a fixed addition chain
+        '''
+        if self.num == 0:
+            return True
+        x2, x3, x22, x223 = s256_chain(self.num)
+        # (P-1)/2 is 223 ones, a zero, 22 ones, 0b0000101 and then 0b11
+        t = square_n(x223, 23) * x22 % P
+        t = square_n(t, 5) * self.num % P
+        t = square_n(t, 2) * self.num % P
+        t = square_n(t, 2) * x2 % P
+        return t == 1
+
+
+def square_n(a, n):
+    '''squares a n times mod P'''
+    for _ in range(n):
+        a = a * a % P
+    return a
+
+
+def s256_chain(a):
+    '''returns a^(2^k - 1) mod P for k = 2, 3, 22 and 223. These are the
+    runs of ones that make up exponents like (P+1)/4 and (P-1)/2, so both
+    can be finished off in a few steps. This takes 222 squarings and 11
+    multiplications, fewer than pow needs for such dense exponents
+    '''
+    x2 = square_n(a, 1) * a % P
+    x3 = square_n(x2, 1) * a % P
+    x6 = square_n(x3, 3) * x3 % P
+    x9 = square_n(x6, 3) * x3 % P
+    x11 = square_n(x9, 2) * x2 % P
+    x22 = square_n(x11, 11) * x11 % P
+    x44 = square_n(x22, 22) * x22 % P
+    x88 = square_n(x44, 44) * x44 % P
+    x176 = square_n(x88, 88) * x88 % P
+    x220 = square_n(x176, 44) * x44 % P
+    x223 = square_n(x220, 3) * x3 % P
+    return x2, x3, x22, x223
+
+
+# a and b are the same for every point, so share them instead of building
+# new field elements for each point
+S256_A = S256Field(A)
+S256_B = S256Field(B)
+
+
+# Jacobian coordinates (X, Y, Z) represent the affine point (X/Z^2, Y/Z^3).
+# Adding and doubling in this form needs no division, so we only pay for
+# one inversion when converting back to affine. Z == 0 is the point at
+# infinity.
+JACOBIAN_INFINITY = (1, 1, 0)
+
+
+def jacobian_double(p):
+    '''Doubles a point in Jacobian coordinates on y^2=x^3+7 over F_P'''
+    x1, y1, z1 = p
+    if z1 == 0 or y1 == 0:
+        return JACOBIAN_INFINITY
+    # dbl-2009-l from the Explicit-Formulas Database (a=0)
+    a = x1 * x1 % P
+    b = y1 * y1 % P
+    c = b * b % P
+    d = 2 * ((x1 + b) ** 2 - a - c) % P
+    e = 3 * a % P
+    x3 = (e * e - 2 * d) % P
+    y3 = (e * (d - x3) - 8 * c) % P
+    z3 = 2 * y1 * z1 % P
+    return (x3, y3, z3)
+
+
+def jacobian_add(p, q):
+    '''Adds two points in Jacobian coordinates on y^2=x^3+7 over F_P'''
+    x1, y1, z1 = p
+    x2, y2, z2 = q
+    # identity
+    if z1 == 0:
+        return q
+    if z2 == 0:
+        return p
+    z1z1 = z1 * z1 % P
+    u2 = x2 * z1z1 % P
+    s2 = y2 * z1 * z1z1 % P
+    if z2 == 1:
+        # q is affine, which saves a few multiplications
+        u1, s1 = x1, y1
+    else:
+        z2z2 = z2 * z2 % P
+        u1 = x1 * z2z2 % P
+        s1 = y1 * z2 * z2z2 % P
+    h = (u2 - u1) % P
+    r = (s2 - s1) % P
+    if h == 0:
+        if r == 0:
+            # we're adding a point to itself
+            return jacobian_double(p)
+        # point at infinity
+        return JACOBIAN_INFINITY
+    hh = h * h % P
+    hhh = h * hh % P
+    v = u1 * hh % P
+    x3 = (r * r - hhh - 2 * v) % P
+    y3 = (r * (v - x3) - s1 * hhh) % P
+    z3 = z1 * z2 * h % P
+    return (x3, y3, z3)
+
+
+def batch_inverse(values, modulus):
+    '''returns the inverses of values modulo a prime modulus with a single
+    modular exponentiation (Montgomery's trick). 0 has no inverse and is
+    returned as 0
+    '''
+    # prefix[i] is the product of the nonzero values before index i
+    prefix = []
+    product = 1
+    for value in values:
+        prefix.append(product)
+        if value % modulus:
+            product = product * value % modulus
+    inv = invert(product, modulus)
+    result = [0] * len(values)
+    # walk backwards, peeling one value at a time off the inverted product
+    for i in reversed(range(len(values))):
+        value = values[i] % modulus
+        if value:
+            result[i] = inv * prefix[i] % modulus
+            inv = inv * value % modulus
+    return result
+
+
+def jacobian_to_affine(p):
+    '''returns the affine (x, y) of a Jacobian point or None for infinity'''
+    x, y, z = p
+    if z == 0:
+        return None
+    z_inv = invert(z, P)
+    z_inv2 = z_inv * z_inv % P
+    return (x * z_inv2 % P, y * z_inv2 * z_inv % P)
+
+
+def batch_to_affine(points):
+    '''jacobian_to_affine for many points, sharing a single inversion'''
+    z_invs = batch_inverse([z for x, y, z in points], P)
+    result = []
+    for (x, y, z), z_inv in zip(points, z_invs):
+        if z == 0:
+            result.append(None)
+        else:
+            z_inv2 = z_inv * z_inv % P
+            result.append((x * z_inv2 % P, y * z_inv2 * z_inv % P))
+    return result
+
+
+def glv_split(coefficient):
+    '''returns (k1, k2) with k1 + k2*LAMBDA = coefficient mod N, where k1
+    and k2 are around 128 bits each and may be negative
+    '''
+    # round coefficient*(B2, -B1)/N to the nearest integers
+    c1 = (B2 * coefficient + N // 2) // N
+    c2 = (-B1 * coefficient + N // 2) // N
+    k1 = coefficient - c1 * A1 - c2 * A2
+    k2 = -c1 * B1 - c2 * B2
+    return k1, k2
+
+
+def wnaf(coefficient, w):
+    '''returns the width-w non-adjacent form of coefficient, least
+    significant digit first. Every nonzero digit is odd and less than
+    2^(w-1) in absolute value, and is followed by at least w-1 zeros
+    '''
+    digits = []
+    while coefficient:
+        if coefficient & 1:
+            digit = coefficient & (2**w - 1)
+            if digit >= 2**(w-1):
+                digit -= 2**w
+            coefficient -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        coefficient >>= 1
+    return digits
+
+
+# Window sizes for wNAF. A table of 2^(w-2) odd multiples built for a
+# single multiplication has to pay for itself, so the window grows with the
+# scalar. Tables kept on a point by precompute() are built once and can
+# afford to be wider. G always keeps one.
+PRECOMPUTE_WINDOW = 6
+G_WNAF_WINDOW = 8
+
+
+def wnaf_window(bits):
+    '''returns the wNAF window that minimizes the additions needed to
+    multiply by a scalar of this many bits, counting the table's cost
+    '''
+    if bits <= 12:
+        return 2
+    elif bits <= 48:
+        return 3
+    elif bits <= 128:
+        return 4
+    else:
+        return 5
+
+
+def odd_multiples(p, w):
+    '''returns [p, 3p, 5p, ..., (2^(w-1)-1)p] in Jacobian coordinates'''
+    double = jacobian_double(p)
+    result = [p]
+    for _ in range(2**(w-2) - 1):
+        result.append(jacobian_add(result[-1], double))
+    return result
+
+
+def encode_sec(x, y, compressed=True):
+    '''returns the binary sec format of the point with affine coordinates
+    x and y, given as ints
+    '''
+    if compressed:
+        # 02 if y is even, 03 if y is odd
+        return bytes([2 + (y & 1)]) + int(x).to_bytes(32, 'big')
+    else:
+        return b'\x04' + int(x).to_bytes(32, 'big') + int(y).to_bytes(32, 'big')
 
 
 class S256Point(Point):
     bits = 256
+    # set to True to multiply arbitrary points using the GLV endomorphism
+    use_glv = False
+    # (w, odd multiples) kept by precompute() for points used many times
+    _wnaf_table = None
+    # Jacobian coordinates of a point whose affine x and y haven't been
+    # computed yet. None once x and y are known.
+    _jacobian = None
 
     def __init__(self, x, y, a=None, b=None):
-        a, b = S256Field(A), S256Field(B)
+        # coordinates from outside are checked to be on the curve. x and y
+        # can't be reassigned afterwards, since parse hands out shared points
+        self.a, self.b = S256_A, S256_B
         if x is None:
-            super().__init__(x=None, y=None, a=a, b=b)
-        elif type(x) == int:
-            super().__init__(x=S256Field(x), y=S256Field(y), a=a, b=b)
+            # point at infinity
+            self._x, self._y = None, None
+            return
+        if type(x) in (int, type(to_num(0))):
+            x, y = S256Field(x), S256Field(y)
+        if y**2 != x**3 + self.a * x + self.b:
+            raise RuntimeError('Not a point on the curve')
+        self._x, self._y = x, y
+
+    @classmethod
+    def from_jacobian(cls, jacobian):
+        '''returns a point from Jacobian coordinates. The conversion to
+        affine x and y is deferred until one of them is read
+        '''
+        # points derived from valid points are on the curve by construction,
+        # so this skips __init__ and its curve check
+        point = cls.__new__(cls)
+        point.a, point.b = S256_A, S256_B
+        point._jacobian = jacobian
+        return point
+
+    @classmethod
+    def _from_affine(cls, x, y):
+        '''returns the point (x, y) without checking that it's on the curve.
+        Only for coordinates that were already checked
+        '''
+        point = cls.__new__(cls)
+        point.a, point.b = S256_A, S256_B
+        point._x, point._y = x, y
+        return point
+
+    def jacobian(self):
+        '''returns the (X, Y, Z) Jacobian coordinates of this point'''
+        if self._jacobian is not None:
+            return self._jacobian
+        if self._x is None:
+            return JACOBIAN_INFINITY
+        return (self._x.num, self._y.num, 1)
+
+    def _set_affine(self, affine):
+        self._jacobian = None
+        if affine is None:
+            self._x, self._y = None, None
         else:
-            super().__init__(x=x, y=y, a=a, b=b)
+            self._x = S256Field._new(affine[0], P)
+            self._y = S256Field._new(affine[1], P)
+
+    def _to_affine(self):
+        self._set_affine(jacobian_to_affine(self._jacobian))
+
+    @classmethod
+    def normalize(cls, points):
+        '''converts all the points to affine coordinates at once, sharing a
+        single inversion. Worth doing before calling sec() on many points
+        '''
+        pending = [p for p in points if p._jacobian is not None]
+        affines = batch_to_affine([p._jacobian for p in pending])
+        for point, affine in zip(pending, affines):
+            point._set_affine(affine)
+
+    @property
+    def x(self):
+        if self._jacobian is not None:
+            self._to_affine()
+        return self._x
+
+    @property
+    def y(self):
+        if self._jacobian is not None:
+            self._to_affine()
+        return self._y
 
     def __repr__(self):
         if self.x is None:
@@ -341,33 +746,128 @@ class S256Point(Point):
         else:
             return 'Point({},{})'.format(self.x, self.y)
 
+    def __add__(self, other):
+        return self.from_jacobian(
+            jacobian_add(self.jacobian(), other.jacobian()))
+
     def __rmul__(self, coefficient):
-        # current will undergo binary expansion
-        current = self
-        # result is what we return, starts at 0
-        result = S256Point(None, None)
-        # we double 256 times and add where there is a 1 in the binary
-        # representation of coefficient
-        for i in range(self.bits):
-            if coefficient & 1:
-                result += current
-            current += current
-            # we shift the coefficient to the right
-            coefficient >>= 1
-        return result
+        # N*G is the point at infinity, so only the coefficient mod N matters
+        coefficient %= N
+        if self is G:
+            # the generator has a precomputed table, no doublings needed
+            return self.from_jacobian(generator_mul(coefficient))
+        if self.use_glv:
+            return self.glv_mul(coefficient)
+        # wNAF with a table of odd multiples of self
+        return self.multi_mul([(coefficient, self)])
+
+    def precompute(self, w=PRECOMPUTE_WINDOW):
+        '''builds a table of odd multiples of this point and keeps it, so
+        every later multiplication by this point can use it. Worth doing
+        for points that get multiplied many times
+        '''
+        p = self.jacobian()
+        if p[2] == 0:
+            return
+        table = [(x, y, 1) for x, y in batch_to_affine(odd_multiples(p, w))]
+        self._wnaf_table = (w, table)
 
-    def sec(self, compressed=True):
-        if compressed:
-            if self.y.num % 2 == 1:
-                prefix = '03'
-            else:
-                prefix = '02'
-            return '{}{}'.format(prefix, self.x.hex())
+    def wnaf_table(self, bits):
+        '''returns the window w and the table of odd multiples of this
+        point to use for a scalar with this many bits
+        '''
+        if self._wnaf_table is None and self is G:
+            self.precompute(G_WNAF_WINDOW)
+        if self._wnaf_table is not None:
+            return self._wnaf_table
+        w = wnaf_window(bits)
+        return w, odd_multiples(self.jacobian(), w)
+
+    def glv_mul(self, coefficient):
+        '''returns coefficient*self by splitting coefficient into two
+        half-length scalars k1 + k2*LAMBDA, which halves the doublings
+        '''
+        k1, k2 = glv_split(coefficient % N)
+        x, y, z = self.jacobian()
+        p1 = (x, y, z)
+        # LAMBDA*self is cheap: just multiply x by BETA
+        p2 = (BETA * x % P, y, z)
+        # multi_mul wants non-negative scalars, so negate the points instead
+        if k1 < 0:
+            k1, p1 = -k1, (x, -y % P, z)
+        if k2 < 0:
+            k2, p2 = -k2, (p2[0], -y % P, z)
+        return self.multi_mul([
+            (k1, self.from_jacobian(p1)),
+            (k2, self.from_jacobian(p2)),
+        ])
+
+    def ladder_mul(self, coefficient):
+        '''returns coefficient*self with a Montgomery ladder, for secret
+        coefficients. Every bit costs one addition and one doubling, and
+        which registers they act on is picked by indexing rather than by
+        branching on the bit. Python ints don't give true constant-time
+        arithmetic, but this keeps the work independent of the coefficient
+        '''
+        coefficient %= N
+        # add N or 2N so bit 256 is always set. The multiple is the same
+        # but the ladder never starts from the point at infinity, whose
+        # shortcut in jacobian_add would depend on the leading zeros
+        if coefficient + N >= 2**self.bits:
+            coefficient += N
         else:
-            return '04{}{}'.format(self.x.hex(), self.y.hex())
+            coefficient += 2*N
+        p = self.jacobian()
+        # invariant: registers[1] - registers[0] == self
+        registers = [p, jacobian_double(p)]
+        for i in reversed(range(self.bits)):
+            bit = (coefficient >> i) & 1
+            registers[1-bit] = jacobian_add(registers[0], registers[1])
+            registers[bit] = jacobian_double(registers[bit])
+        return self.from_jacobian(registers[0])
+
+    @classmethod
+    def multi_mul(cls, pairs):
+        '''returns the sum of scalar*point for each (scalar, point) in pairs.
+        The scalars are written in wNAF and walked together, so all of
+        them share a single chain of doublings (Strauss-Shamir)
+        '''
+        nafs = []
+        tables = []
+        for scalar, point in pairs:
+            scalar %= N
+            if scalar == 0 or point.jacobian()[2] == 0:
+                continue
+            w, table = point.wnaf_table(scalar.bit_length())
+            nafs.append(wnaf(scalar, w))
+            tables.append(table)
+        result = JACOBIAN_INFINITY
+        length = max([len(naf) for naf in nafs], default=0)
+        # go from the most significant digit down, doubling once per digit
+        for i in reversed(range(length)):
+            result = jacobian_double(result)
+            for naf, table in zip(nafs, tables):
+                if i >= len(naf) or naf[i] == 0:
+                    continue
+                digit = naf[i]
+                if digit > 0:
+                    result = jacobian_add(result, table[digit >> 1])
+                else:
+                    # subtract by adding the negated point (x, -y)
+                    x, y, z = table[-digit >> 1]
+                    result = jacobian_add(result, (x, -y % P, z))
+        return cls.from_jacobian(result)
+
+    def sec_bytes(self, compressed=True):
+        '''returns the binary version of the sec format'''
+        return encode_sec(self.x.num, self.y.num, compressed=compressed)
+
+    def sec(self, compressed=True):
+        '''returns the hex version of the sec format'''
+        return hexlify(self.sec_bytes(compressed=compressed)).decode('ascii')
 
     def address(self, compressed=True, testnet=False):
-        h160 = hash160(unhexlify(self.sec(compressed=compressed)))
+        h160 = hash160(self.sec_bytes(compressed=compressed))
         if testnet:
             prefix = b'\x6f'
         else:
@@ -377,40 +877,110 @@ class S256Point(Point):
         return encode_base58(raw).decode('ascii')
 
     def verify(self, z, sig):
-        u = z * pow(sig.s, N-2, N) % N
-        v = sig.r * pow(sig.s, N-2, N) % N
-        return (u*G + v*self).x.num == sig.r
+        return BACKEND.verify(self, z, sig)
 
     @classmethod
-    def parse(self, sec_bin):
-        '''returns a Point object from a compressed sec binary (not hex)
+    def parse(cls, sec_bin):
+        '''returns a Point object from a sec binary (not hex). Points are
+        kept in a bounded LRU cache keyed by the sec binary, so callers
+        parsing the same sec share one point. Its x and y are read-only,
+        and precompute() only adds a table for the same point
         '''
-        if sec_bin[0] == 4:
-            x = int(hexlify(sec_bin[1:33]), 16)
-            x = int(hexlify(sec_bin[33:65]), 16)
-            return S256Point(x=x, y=y)
-        is_even = sec_bin[0] == 2
-        x = S256Field(int(hexlify(sec_bin[1:]), 16))
-        # right side of the equation y^2 = x^3 + 7
-        alpha = x**3 + S256Field(B)
-        # solve for left side
-        beta = alpha.sqrt()
-        if beta.num % 2 == 0:
-            even_beta = beta
-            odd_beta = S256Field(P - beta.num)
-        else:
-            even_beta = S256Field(P - beta.num)
-            odd_beta = beta
-        if is_even:
-            return S256Point(x, even_beta)
-        else:
-            return S256Point(x, odd_beta)
+        return parse_sec(bytes(sec_bin))
+
+    @staticmethod
+    def parse_cache_info():
+        '''returns the hits, misses, maxsize and currsize of the parse cache'''
+        return parse_sec.cache_info()
+
+
+# Decompressing a sec pubkey takes a modular square root, and popular keys
+# show up in transaction after transaction, so parsed points are cached.
+# lru_cache is thread-safe and keeps the hit and miss counts for us.
+PARSE_CACHE_SIZE = 10000
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_sec(sec_bin):
+    '''returns a Point object from a sec binary (not hex), compressed or
+    uncompressed. Use S256Point.parse, which goes through the cache
+    '''
+    if sec_bin[0] == 4:
+        x = int.from_bytes(sec_bin[1:33], 'big')
+        y = int.from_bytes(sec_bin[33:65], 'big')
+        return S256Point(x=x, y=y)
+    is_even = sec_bin[0] == 2
+    x = S256Field(int.from_bytes(sec_bin[1:], 'big'))
+    # right side of the equation y^2 = x^3 + 7
+    alpha = x**3 + S256_B
+    # solve for left side
+    beta = alpha.sqrt()
+    # alpha.sqrt() is only a root if alpha is a square. Squaring it back is
+    # much cheaper than a separate is_square check
+    if beta * beta != alpha:
+        raise RuntimeError('Not a point on the curve')
+    if beta.num % 2 == 0:
+        even_beta = beta
+        odd_beta = S256Field._new(P - beta.num, P)
+    else:
+        even_beta = S256Field._new(P - beta.num, P)
+        odd_beta = beta
+    # (x, beta) is on the curve since beta^2 = x^3 + 7
+    if is_even:
+        return S256Point._from_affine(x, even_beta)
+    else:
+        return S256Point._from_affine(x, odd_beta)
 
 
 G = S256Point(
     0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
     0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
 
+# Fixed-base comb for G: row i of the table holds j*2^(4i)*G in affine
+# coordinates for j from 1 to 15. k*G is then the sum of one entry per
+# 4-bit window of k, so it takes at most 64 additions and no doublings.
+# The table is built the first time it's needed.
+G_WINDOW = 4
+_generator_table = None
+
+
+def generator_table():
+    '''returns the precomputed table of multiples of G, building it once'''
+    global _generator_table
+    if _generator_table is None:
+        points = []
+        base = G.jacobian()
+        for _ in range(0, S256Point.bits, G_WINDOW):
+            current = base
+            for _ in range(1, 2**G_WINDOW):
+                points.append(current)
+                current = jacobian_add(current, base)
+            # current is now 2^G_WINDOW times base
+            base = current
+        # convert the whole table to affine with one inversion
+        affines = [(x, y, 1) for x, y in batch_to_affine(points)]
+        row_length = 2**G_WINDOW - 1
+        _generator_table = [
+            [None] + affines[i:i+row_length]
+            for i in range(0, len(affines), row_length)
+        ]
+    return _generator_table
+
+
+def generator_mul(coefficient):
+    '''returns coefficient*G in Jacobian coordinates using the comb table'''
+    table = generator_table()
+    mask = 2**G_WINDOW - 1
+    result = JACOBIAN_INFINITY
+    for row in table:
+        if coefficient == 0:
+            break
+        digit = coefficient & mask
+        if digit:
+            result = jacobian_add(result, row[digit])
+        coefficient >>= G_WINDOW
+    return result
+
 
 class S256Test(TestCase):
 
@@ -442,6 +1012,116 @@ class S256Test(TestCase):
             0x10B49C67FA9365AD7B90DAB070BE339A1DAF9052373EC30FFAE4F72D5E66D053)
         self.assertEqual((point.x.num, point.y.num), expected)
 
+    def test_on_curve(self):
+        with self.assertRaises(RuntimeError):
+            S256Point(G.x.num, G.y.num + 1)
+        point = S256Point(G.x.num, G.y.num)
+        self.assertTrue(point.a is S256_A and point.b is S256_B)
+        point = 7*point
+        self.assertTrue(point.a is S256_A and point.b is S256_B)
+
+    def test_jacobian(self):
+        # Jacobian arithmetic should agree with the affine formulas in Point
+        p1 = S256Point(
+            0x5CBDF0646E5DB4EAA398F365F2EA7A0E3D419B7E0330E39CE92BDDEDCAC4F9BC,
+            0x6AEBCA40BA255960A3178D6D861A54DBA813D0B813FDE7B5A5082628087264DA)
+        p2 = 1485*G
+        self.assertEqual(p1 + p2, Point.__add__(p1, p2))
+        self.assertEqual(p1 + p1, Point.__add__(p1, p1))
+        self.assertEqual(p2 + p2 + p1, Point.__add__(Point.__add__(p2, p2), p1))
+        self.assertIsNone((p1 + (N-7)*G).x)
+        self.assertEqual(p1 + S256Point(None, None), p1)
+
+    def test_generator_mul(self):
+        # the comb table should agree with plain double-and-add
+        coefficients = (1, 15, 16, 0xdeadbeef, 2**255 + 12345, N-1, randint(1, N))
+        for coefficient in coefficients:
+            point = S256Point(G.x, G.y)
+            self.assertFalse(point is G)
+            self.assertEqual(coefficient*G, coefficient*point)
+
+    def test_glv(self):
+        for coefficient in (7, 1485, 2**128, 2**240+2**31, N-1, randint(1, N)):
+            k1, k2 = glv_split(coefficient)
+            self.assertEqual((k1 + k2*LAMBDA) % N, coefficient)
+            self.assertLess(abs(k1), 2**129)
+            self.assertLess(abs(k2), 2**129)
+        # same vectors as test_pubpoint
+        vectors = (
+            (7, 0x5CBDF0646E5DB4EAA398F365F2EA7A0E3D419B7E0330E39CE92BDDEDCAC4F9BC),
+            (1485, 0xC982196A7466FBBBB0E27A940B6AF926C1A74D5AD07128C82824A11B5398AFDA),
+            (2**128, 0x8F68B9D2F63B5F339239C1AD981F162EE88C5678723EA3351B7B444C9EC4C0DA),
+            (2**240+2**31, 0x9577FF57C8234558F293DF502CA4F09CBC65A6572C842B39B366F21717945116),
+        )
+        for coefficient, x in vectors:
+            self.assertEqual(G.glv_mul(coefficient).x.num, x)
+        point = 1485*G
+        coefficient = randint(1, N)
+        self.assertEqual(point.glv_mul(coefficient), coefficient*point)
+        self.assertIsNone(point.glv_mul(N).x)
+
+    def test_batch_inverse(self):
+        values = [3, 0, 24, 1, N-1, randint(1, N-1)]
+        inverses = batch_inverse(values, N)
+        for value, inverse in zip(values, inverses):
+            if value == 0:
+                self.assertEqual(inverse, 0)
+            else:
+                self.assertEqual(value * inverse % N, 1)
+        self.assertEqual(batch_inverse([3, 24], 31), [21, 22])
+        self.assertEqual(batch_inverse([], 31), [])
+
+    def test_normalize(self):
+        coefficients = (7, 1485, 2**128, 2**240+2**31)
+        points = [k*G + G for k in coefficients] + [G, N*G]
+        S256Point.normalize(points)
+        for k, point in zip(coefficients, points):
+            self.assertIsNone(point._jacobian)
+            self.assertEqual(point.sec(), ((k+1)*S256Point(G.x, G.y)).sec())
+        self.assertIsNone(points[-1].x)
+
+    def test_wnaf(self):
+        for coefficient in (1, 7, 0xdeadbeef, randint(1, N)):
+            for w in (2, 5, 8):
+                digits = wnaf(coefficient, w)
+                total = sum(d * 2**i for i, d in enumerate(digits))
+                self.assertEqual(total, coefficient)
+                for d in digits:
+                    self.assertTrue(d == 0 or (d % 2 == 1 and abs(d) < 2**(w-1)))
+
+    def test_ladder_mul(self):
+        point = 1485*G
+        for coefficient in (1, 2, 7, 2**128, N-1, randint(1, N), 2**256 - 1):
+            self.assertEqual(point.ladder_mul(coefficient), coefficient*point)
+            self.assertEqual(G.ladder_mul(coefficient), coefficient*G)
+        self.assertIsNone(point.ladder_mul(0).x)
+        self.assertIsNone(point.ladder_mul(N).x)
+
+    def test_precompute(self):
+        point = S256Point.parse(unhexlify('0349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278a'))
+        coefficients = (3, 2**20 + 1, 2**100 - 1, randint(1, N))
+        want = [(k*point).sec() for k in coefficients]
+        copy = S256Point(point.x, point.y)
+        copy.precompute()
+        self.assertEqual(copy.wnaf_table(256)[0], PRECOMPUTE_WINDOW)
+        self.assertEqual([(k*copy).sec() for k in coefficients], want)
+        self.assertEqual(G.wnaf_table(256)[0], G_WNAF_WINDOW)
+        for bits in (1, 8, 64, 256):
+            self.assertEqual(point.wnaf_table(bits)[0], wnaf_window(bits))
+        infinity = N*G
+        infinity.precompute()
+        self.assertIsNone((5*infinity).x)
+
+    def test_multi_mul(self):
+        p1 = 1485*G
+        p2 = S256Point.parse(unhexlify('0349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278a'))
+        a, b, c = randint(1, N), randint(1, N), 2**128
+        want = a*G + b*p1 + c*p2
+        self.assertEqual(S256Point.multi_mul([(a, G), (b, p1), (c, p2)]), want)
+        self.assertEqual(S256Point.multi_mul([(a, p1)]), a*p1)
+        self.assertEqual(S256Point.multi_mul([(N-1, p1), (1, p1)]).x, None)
+        self.assertEqual(S256Point.multi_mul([]).x, None)
+
     def test_sec(self):
         coefficient = 999**3
         uncompressed = '049d5ca49670cbe4c3bfa84c96a8c87df086c6ea6a24ba6b809c9de234496808d56fa15cc7f3d38cda98dee2419f415b7513dde1301f8643cd9245aea7f3f911f9'
@@ -449,6 +1129,8 @@ class S256Test(TestCase):
         point = coefficient*G
         self.assertEqual(point.sec(compressed=False), uncompressed)
         self.assertEqual(point.sec(compressed=True), compressed)
+        self.assertEqual(point.sec_bytes(compressed=False), unhexlify(uncompressed))
+        self.assertEqual(point.sec_bytes(compressed=True), unhexlify(compressed))
         coefficient = 123
         uncompressed = '04a598a8030da6d86c6bc7f2f5144ea549d28211ea58faa70ebf4c1e665c1fe9b5204b5d6f84822c307e4b4a7140737aec23fc63b65b35f86a10026dbd2d864e6b'
         compressed = '03a598a8030da6d86c6bc7f2f5144ea549d28211ea58faa70ebf4c1e665c1fe9b5'
@@ -508,6 +1190,40 @@ class S256Test(TestCase):
         point = S256Point.parse(sec)
         want = 0xa56c896489c71dfc65701ce25050f542f336893fb8cd15f4e8e5c124dbf58e47
         self.assertEqual(point.y.num, want)
+        uncompressed = unhexlify(point.sec(compressed=False))
+        self.assertEqual(S256Point.parse(uncompressed), point)
+        with self.assertRaises(RuntimeError):
+            S256Point.parse(uncompressed[:-1] + b'\x00')
+
+    def test_sqrt(self):
+        for num in (0, 1, 4, 7, randint(0, P-1), P-1):
+            a = S256Field(num)
+            root = a.sqrt()
+            self.assertEqual(root, a**((P+1)//4))
+            self.assertEqual(a.is_square(), root*root == a)
+        self.assertTrue(S256Field(4).is_square())
+        # -1 is not a square since P = 3 mod 4
+        self.assertFalse(S256Field(P-1).is_square())
+        # x = 5 has no point on the curve
+        self.assertFalse((S256Field(5)**3 + S256_B).is_square())
+        with self.assertRaises(RuntimeError):
+            S256Point.parse(b'\x02' + (5).to_bytes(32, 'big'))
+
+    def test_parse_cache(self):
+        sec = unhexlify((4242*G).sec())
+        before = S256Point.parse_cache_info()
+        point = S256Point.parse(sec)
+        self.assertTrue(S256Point.parse(bytearray(sec)) is point)
+        after = S256Point.parse_cache_info()
+        self.assertEqual(after.misses - before.misses, 1)
+        self.assertEqual(after.hits - before.hits, 1)
+        self.assertLessEqual(after.currsize, PARSE_CACHE_SIZE)
+        # the shared point can't be changed under the other callers
+        with self.assertRaises(AttributeError):
+            point.x = G.x
+        with self.assertRaises(AttributeError):
+            point.y = G.y
+        self.assertEqual(point.sec(), (4242*G).sec())
 
 
 class Signature:
@@ -521,40 +1237,72 @@ class Signature:
 
     def der(self):
         rbin = self.r.to_bytes(32, byteorder='big')
+        # remove all null bytes at the beginning
+        rbin = rbin.lstrip(b'\x00')
         # if rbin has a high bit, add a 00
-        if rbin[0] > 128:
+        if not rbin or rbin[0] & 0x80:
             rbin = b'\x00' + rbin
         result = bytes([2, len(rbin)]) + rbin
         sbin = self.s.to_bytes(32, byteorder='big')
+        # remove all null bytes at the beginning
+        sbin = sbin.lstrip(b'\x00')
         # if sbin has a high bit, add a 00
-        if sbin[0] > 128:
+        if not sbin or sbin[0] & 0x80:
             sbin = b'\x00' + sbin
         result += bytes([2, len(sbin)]) + sbin
         return bytes([0x30, len(result)]) + result
 
     @classmethod
-    def parse(cls, signature_bin):
-        s = BytesIO(signature_bin)
-        compound = s.read(1)[0]
-        if compound != 0x30:
+    def parse(cls, signature_bin, strict=False):
+        '''parses a DER signature from bytes, bytearray or memoryview. The
+        integers are sliced straight out of the buffer without copying.
+        With strict, the encoding must also follow the BIP66 rules
+        '''
+        sig = memoryview(signature_bin)
+        length = len(sig)
+        if length < 6 or (strict and length > 72):
+            raise RuntimeError("Bad Signature Length")
+        if sig[0] != 0x30:
             raise RuntimeError("Bad Signature")
-        length = s.read(1)[0]
-        if length + 2 != len(signature_bin):
+        if sig[1] + 2 != length:
             raise RuntimeError("Bad Signature Length")
-        marker = s.read(1)[0]
-        if marker != 0x02:
+        if sig[2] != 0x02:
             raise RuntimeError("Bad Signature")
-        rlength = s.read(1)[0]
-        r = int(hexlify(s.read(rlength)), 16)
-        marker = s.read(1)[0]
-        if marker != 0x02:
+        rlength = sig[3]
+        if 6 + rlength > length:
+            raise RuntimeError("Bad Signature Length")
+        rbin = sig[4:4+rlength]
+        if sig[4+rlength] != 0x02:
             raise RuntimeError("Bad Signature")
-        slength = s.read(1)[0]
-        s = int(hexlify(s.read(slength)), 16)
-        if len(signature_bin) != 6 + rlength + slength:
+        slength = sig[5+rlength]
+        sbin = sig[6+rlength:]
+        if length != 6 + rlength + slength:
             raise RuntimeError("Signature too long")
+        if strict:
+            check_der_integer(rbin)
+            check_der_integer(sbin)
+        r = int.from_bytes(rbin, 'big')
+        s = int.from_bytes(sbin, 'big')
         return cls(r, s)
 
+    @classmethod
+    def parse_many(cls, signature_bins, strict=False):
+        '''parses a sequence of DER signatures, returns a list'''
+        parse = cls.parse
+        return [parse(signature_bin, strict) for signature_bin in signature_bins]
+
+
+def check_der_integer(value):
+    '''raises a RuntimeError unless value is a minimally encoded, positive
+    DER integer as BIP66 requires
+    '''
+    if len(value) == 0:
+        raise RuntimeError("Bad Signature: empty integer")
+    if value[0] & 0x80:
+        raise RuntimeError("Bad Signature: negative integer")
+    if len(value) > 1 and value[0] == 0 and not value[1] & 0x80:
+        raise RuntimeError("Bad Signature: integer has extra padding")
+
 
 class SignatureTest(TestCase):
 
@@ -570,24 +1318,107 @@ class SignatureTest(TestCase):
             sig2 = Signature.parse(der)
             self.assertEqual(sig2.r, r)
             self.assertEqual(sig2.s, s)
+            sig2 = Signature.parse(memoryview(der), strict=True)
+            self.assertEqual(sig2.r, r)
+            self.assertEqual(sig2.s, s)
+
+    def test_parse_strict(self):
+        der = unhexlify('3045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed')
+        sig = Signature.parse(der, strict=True)
+        self.assertEqual(sig.der(), der)
+        bad = (
+            # r is negative
+            '3006020180020101',
+            # r has unnecessary padding
+            '300702020001020101',
+            # s is empty
+            '30050201010200',
+            # s is missing its 02 marker
+            '3006020101030101',
+            # length byte is wrong
+            '3007020101020101',
+        )
+        for der in bad:
+            with self.assertRaises(RuntimeError):
+                Signature.parse(unhexlify(der), strict=True)
+        # non-strict parsing still accepts padding and negative integers
+        self.assertEqual(Signature.parse(unhexlify('300702020001020101')).r, 1)
+        self.assertEqual(Signature.parse(unhexlify('3006020180020101')).r, 128)
+
+    def test_parse_many(self):
+        sigs = [Signature(1, 2), Signature(2**255 + 1, 3), Signature(7, 2**200)]
+        parsed = Signature.parse_many([sig.der() for sig in sigs], strict=True)
+        self.assertEqual([(sig.r, sig.s) for sig in parsed],
+                         [(sig.r, sig.s) for sig in sigs])
+
+
+def verify_batch(items):
+    '''items is a sequence of (point, z, sig) triples. Returns a list with
+    whether each signature is valid, in the same order as items
+    '''
+    return BACKEND.verify_batch(items)
+
+
+class VerifyBatchTest(TestCase):
+
+    def test_verify_batch(self):
+        items = []
+        for _ in range(5):
+            pk = PrivateKey(randint(1, N))
+            z = randint(0, 2**256)
+            items.append((pk.point, z, pk.sign(z)))
+        self.assertEqual(verify_batch(items), [True] * 5)
+        point, z, sig = items[1]
+        items[1] = (point, z + 1, sig)
+        point, z, sig = items[3]
+        items[3] = (point, z, Signature(sig.r, 0))
+        point, z, sig = items[4]
+        items[4] = (items[0][0], z, sig)
+        self.assertEqual(verify_batch(items), [True, False, True, False, False])
+        self.assertEqual(verify_batch([]), [])
 
 
 class PrivateKey:
 
-    def __init__(self, secret):
+    def __init__(self, secret, constant_time=False):
         self.secret = secret
-        self.point = secret*G
+        # constant_time multiplies G by the secret and by the nonces with
+        # the Montgomery ladder instead of the faster precomputed table
+        self.constant_time = constant_time
+        self.point = BACKEND.public_point(secret, constant_time=constant_time)
 
     def hex(self):
         return '{:x}'.format(self.secret).zfill(64)
 
-    def sign(self, z):
-        k = randint(0, 2**256)
-        r = (k*G).x.num
-        s = (z + r*self.secret) * pow(k, N-2, N) % N
-        if s*2 > N:
-            s = N - s
-        return Signature(r, s)
+    def sign(self, z, deterministic=True):
+        '''returns a Signature for z. The nonce comes from RFC 6979 unless
+        deterministic is False, in which case it is random
+        '''
+        return self.sign_many([z], deterministic=deterministic)[0]
+
+    def sign_many(self, zs, deterministic=True):
+        '''returns a list of Signatures, one for each z in zs'''
+        return BACKEND.sign_many(self, zs, deterministic=deterministic)
+
+    def deterministic_k(self, z):
+        '''returns the RFC 6979 nonce for z, using HMAC-SHA256'''
+        k = b'\x00' * 32
+        v = b'\x01' * 32
+        z_bytes = (z % N).to_bytes(32, 'big')
+        # RFC 6979 takes the key as an integer in [1, N-1]
+        secret_bytes = (self.secret % N).to_bytes(32, 'big')
+        s256 = hashlib.sha256
+        k = hmac.new(k, v + b'\x00' + secret_bytes + z_bytes, s256).digest()
+        v = hmac.new(k, v, s256).digest()
+        k = hmac.new(k, v + b'\x01' + secret_bytes + z_bytes, s256).digest()
+        v = hmac.new(k, v, s256).digest()
+        while True:
+            v = hmac.new(k, v, s256).digest()
+            candidate = int.from_bytes(v, 'big')
+            if candidate >= 1 and candidate < N:
+                return candidate
+            k = hmac.new(k, v + b'\x00', s256).digest()
+            v = hmac.new(k, v, s256).digest()
 
     def wif(self, compressed=True, testnet=False):
         if testnet:
@@ -609,6 +1440,39 @@ class PrivateKeyTest(TestCase):
         z = randint(0, 2**256)
         sig = pk.sign(z)
         self.assertTrue(pk.point.verify(z, sig))
+        sig = pk.sign(z, deterministic=False)
+        self.assertTrue(pk.point.verify(z, sig))
+
+    def test_deterministic_k(self):
+        pk = PrivateKey(1)
+        z = int.from_bytes(hashlib.sha256(b'Satoshi Nakamoto').digest(), 'big')
+        want = 0x8F8A276C19F4149656B280621E358CCE24F5F52542772691EE69063B74F15D15
+        self.assertEqual(pk.deterministic_k(z), want)
+        sig = pk.sign(z)
+        self.assertEqual(sig.r, 0x934B1EA10A4B3C1757E2B0C017D0B6143CE3C9A7E6A4A49860D7A6AB210EE3D8)
+        self.assertEqual(sig.s, 0x2442CE9D2B916064108014783E923EC36B49743E2FFA1C4496F01A512AAFD9E5)
+        # secrets that are the same key mod N get the same nonce
+        self.assertEqual(PrivateKey(N+1).deterministic_k(z), want)
+        sig = PrivateKey(2**256+1).sign(z)
+        self.assertEqual(sig.r, PrivateKey((2**256+1) % N).sign(z).r)
+
+    def test_constant_time(self):
+        secret = randint(1, N)
+        pk = PrivateKey(secret, constant_time=True)
+        self.assertEqual(pk.point, PrivateKey(secret).point)
+        z = randint(0, 2**256)
+        sig = pk.sign(z)
+        self.assertTrue(pk.point.verify(z, sig))
+        self.assertEqual(sig.r, PrivateKey(secret).sign(z).r)
+
+    def test_sign_many(self):
+        pk = PrivateKey(randint(1, N))
+        zs = [randint(0, 2**256) for _ in range(5)]
+        sigs = pk.sign_many(zs)
+        for z, sig in zip(zs, sigs):
+            self.assertTrue(pk.point.verify(z, sig))
+            self.assertEqual((sig.r, sig.s), (pk.sign(z).r, pk.sign(z).s))
+        self.assertEqual(pk.sign_many([]), [])
 
     def test_wif(self):
         pk = PrivateKey(2**256-2**199)
@@ -623,3 +1487,259 @@ class PrivateKeyTest(TestCase):
         pk = PrivateKey(0x1cca23de92fd1862fb5b76e5f4f50eb082165e5191e116c18ed1a6b24be6a53f)
         expected = 'cNYfWuhDpbNM1JWc3c6JTrtrFVxU4AGhUKgw5f93NP2QaBqmxKkg'
         self.assertEqual(pk.wif(compressed=True, testnet=True), expected)
+
+
+class PythonBackend:
+    '''The pure-Python implementation of the operations that a native
+    library can take over. Always available
+    '''
+    name = 'python'
+
+    def public_point(self, secret, constant_time=False):
+        '''returns secret*G'''
+        if constant_time:
+            return G.ladder_mul(secret)
+        return secret*G
+
+    def verify(self, point, z, sig):
+        '''returns whether sig is a valid signature of z by point'''
+        if not (0 < sig.r < N and 0 < sig.s < N):
+            return False
+        s_inv = invert(sig.s, N)
+        u = z * s_inv % N
+        v = sig.r * s_inv % N
+        # u*G + v*point, sharing the doublings between both halves
+        total = S256Point.multi_mul([(u, G), (v, point)])
+        return total.x is not None and total.x.num == sig.r
+
+    def verify_batch(self, items):
+        '''returns whether each (point, z, sig) in items is valid.
+
+        An ECDSA signature only carries the x coordinate of R, so signatures
+        can't be folded into one combined equation. Instead the work around
+        each check is shared: all the s values are inverted together with
+        batch_inverse and each u*G + v*P is compared against r without ever
+        leaving Jacobian coordinates.
+        '''
+        results = [False] * len(items)
+        # signatures with r or s out of range are invalid and can't be inverted
+        indices = [
+            i for i, (point, z, sig) in enumerate(items)
+            if 0 < sig.r < N and 0 < sig.s < N
+        ]
+        s_invs = batch_inverse([items[i][2].s for i in indices], N)
+        for i, s_inv in zip(indices, s_invs):
+            point, z, sig = items[i]
+            u = z * s_inv % N
+            v = sig.r * s_inv % N
+            x, y, zz = S256Point.multi_mul([(u, G), (v, point)]).jacobian()
+            # the affine x is x/zz^2, so check x == r*zz^2 instead of dividing
+            results[i] = zz != 0 and x == sig.r * zz * zz % P
+        return results
+
+    def sign_many(self, private_key, zs, deterministic=True):
+        '''returns a Signature by private_key for each z in zs. All the R
+        points are converted to affine together and all the nonces are
+        inverted together, so each needs one inversion in total
+        '''
+        if deterministic:
+            ks = [private_key.deterministic_k(z) for z in zs]
+        else:
+            ks = [randint(1, N-1) for z in zs]
+        # k*G left in Jacobian coordinates, then converted all at once
+        if private_key.constant_time:
+            points = [G.ladder_mul(k).jacobian() for k in ks]
+        else:
+            points = [generator_mul(k) for k in ks]
+        rs = [x for x, y in batch_to_affine(points)]
+        k_invs = batch_inverse(ks, N)
+        sigs = []
+        for z, r, k_inv in zip(zs, rs, k_invs):
+            s = (z + r*private_key.secret) * k_inv % N
+            if s*2 > N:
+                s = N - s
+            sigs.append(Signature(int(r), int(s)))
+        return sigs
+
+
+class CoincurveBackend(PythonBackend):
+    '''Hands signing, verification and key derivation to libsecp256k1
+    through the coincurve bindings, when they are installed. libsecp256k1
+    is constant-time and uses the same RFC 6979 nonces, so signatures are
+    identical to the Python ones
+    '''
+    name = 'coincurve'
+
+    def public_point(self, secret, constant_time=False):
+        secret %= N
+        if secret == 0:
+            return S256Point(None, None)
+        key = coincurve.PrivateKey(secret.to_bytes(32, 'big'))
+        sec = key.public_key.format(compressed=False)
+        x = S256Field._new(int.from_bytes(sec[1:33], 'big'), P)
+        y = S256Field._new(int.from_bytes(sec[33:], 'big'), P)
+        return S256Point._from_affine(x, y)
+
+    def verify(self, point, z, sig):
+        if not (0 < sig.r < N and 0 < sig.s < N) or point.x is None:
+            return False
+        # libsecp256k1 only accepts low s, and (r, s) and (r, N-s) are
+        # equally valid, so normalize first
+        s = sig.s
+        if s*2 > N:
+            s = N - s
+        der = Signature(sig.r, s).der()
+        public_key = coincurve.PublicKey(point.sec_bytes())
+        return public_key.verify(der, (z % N).to_bytes(32, 'big'), hasher=None)
+
+    def verify_batch(self, items):
+        return [self.verify(point, z, sig) for point, z, sig in items]
+
+    def sign_many(self, private_key, zs, deterministic=True):
+        if not deterministic:
+            # libsecp256k1 always uses RFC 6979
+            return super().sign_many(private_key, zs, deterministic=False)
+        key = coincurve.PrivateKey((private_key.secret % N).to_bytes(32, 'big'))
+        return [
+            Signature.parse(key.sign((z % N).to_bytes(32, 'big'), hasher=None))
+            for z in zs
+        ]
+
+
+# use the native backend when it's installed
+if coincurve is None:
+    BACKEND = PythonBackend()
+else:
+    BACKEND = CoincurveBackend()
+
+
+class BackendTest(TestCase):
+
+    def test_python(self):
+        backend = PythonBackend()
+        pk = PrivateKey(12345)
+        self.assertEqual(backend.public_point(12345), pk.point)
+        z = randint(0, 2**256)
+        sig = backend.sign_many(pk, [z])[0]
+        self.assertTrue(backend.verify(pk.point, z, sig))
+        self.assertEqual(backend.verify_batch([(pk.point, z, sig)]), [True])
+
+
+@skipUnless(coincurve, 'coincurve is not installed')
+class BackendParityTest(TestCase):
+    '''Runs the same vectors through the Python and coincurve backends'''
+
+    def setUp(self):
+        self.backends = (PythonBackend(), CoincurveBackend())
+
+    def test_public_point(self):
+        for secret in (7, 1485, 2**128, 2**240+2**31, N-1, N+1, 2**256-2**199):
+            python, native = [b.public_point(secret) for b in self.backends]
+            self.assertEqual(python, native)
+
+    def test_sign(self):
+        for secret in (1, 12345, randint(1, N-1), N+1):
+            pk = PrivateKey(secret)
+            zs = [randint(0, 2**256) for _ in range(3)]
+            python, native = [b.sign_many(pk, zs) for b in self.backends]
+            self.assertEqual([(s.r, s.s) for s in python],
+                             [(s.r, s.s) for s in native])
+
+    def test_verify(self):
+        point = S256Point(
+            0x887387e452b8eacc4acfde10d9aaf7f6d9a0f975aabb10d006e4da568744d06c,
+            0x61de6d95231cd89026e286df3b6ae4a894a3378e393e93a0f45b666329a0ae34)
+        z = 0xec208baa0fc1c19f708a9ca96fdeff3ac3f230bb4a7ba4aede4942ad003c0f60
+        sig = Signature(
+            0xac8d1c87e51d0d441be8b3dd5b05c8795b48875dffe00b7ffcfac23010d3a395,
+            0x68342ceff8935ededd102dd876ffd6ba72d6a427a3edb13d26eb0781cb423c4)
+        items = [
+            (point, z, sig),
+            (point, z + 1, sig),
+            (point, z, Signature(sig.r, N - sig.s)),
+            (point, z, Signature(sig.r, 0)),
+            (G, z, sig),
+        ]
+        python, native = [b.verify_batch(items) for b in self.backends]
+        self.assertEqual(python, [True, False, True, False, False])
+        self.assertEqual(python, native)
+        for item in items:
+            python, native = [b.verify(*item) for b in self.backends]
+            self.assertEqual(python, native)
+
+
+# secrets are handled in chunks: each chunk shares one inversion to get
+# affine coordinates, and is the unit of work sent to other processes
+DERIVE_CHUNK_SIZE = 1000
+
+
+def derive_addresses_chunk(secrets, compressed=True, testnet=False):
+    '''returns a list of (secret, sec, address) for a list of secrets.
+    sec is the binary sec format, not hex
+    '''
+    points = []
+    previous_secret, previous = None, None
+    for secret in secrets:
+        if previous is not None and secret == previous_secret + 1:
+            # the next secret in a run: one addition instead of a multiply
+            current = jacobian_add(previous, G.jacobian())
+        else:
+            current = generator_mul(secret % N)
+        points.append(current)
+        previous_secret, previous = secret, current
+    result = []
+    for secret, affine in zip(secrets, batch_to_affine(points)):
+        if affine is None:
+            raise RuntimeError('secret {} is a multiple of N'.format(secret))
+        sec = encode_sec(affine[0], affine[1], compressed=compressed)
+        address = h160_to_p2pkh_address(hash160(sec), testnet=testnet)
+        result.append((secret, sec, address))
+    return result
+
+
+def derive_addresses(secrets, compressed=True, testnet=False, processes=None,
+                     chunk_size=DERIVE_CHUNK_SIZE):
+    '''takes an iterable of secrets and yields (secret, sec, address) for
+    each, in order. Consecutive secrets are derived by adding G to the
+    previous point. With processes set, chunks are spread over a pool of
+    that many worker processes
+    '''
+    secrets = iter(secrets)
+    chunks = iter(lambda: list(islice(secrets, chunk_size)), [])
+    if not processes:
+        for chunk in chunks:
+            yield from derive_addresses_chunk(chunk, compressed, testnet)
+        return
+    with ProcessPoolExecutor(processes) as executor:
+        # keep a couple of chunks per process in flight, so a long or
+        # endless iterable of secrets is never read far ahead
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(
+                derive_addresses_chunk, chunk, compressed, testnet))
+            if len(pending) >= 2 * processes:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class DeriveAddressesTest(TestCase):
+
+    def test_derive_addresses(self):
+        secrets = [888**3, 321, 322, 323, 4242424242, 1, N-1, N+5]
+        for compressed in (True, False):
+            want = []
+            for secret in secrets:
+                point = PrivateKey(secret).point
+                sec = unhexlify(point.sec(compressed=compressed))
+                address = point.address(compressed=compressed, testnet=True)
+                want.append((secret, sec, address))
+            got = derive_addresses(
+                secrets, compressed=compressed, testnet=True, chunk_size=3)
+            self.assertEqual(list(got), want)
+            got = derive_addresses(
+                iter(secrets), compressed=compressed, testnet=True,
+                processes=2, chunk_size=3)
+            self.assertEqual(list(got), want)
+        with self.assertRaises(RuntimeError):
+            list(derive_addresses([5, N]))
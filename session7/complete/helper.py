@@ -1,4 +1,5 @@
 from binascii import hexlify, unhexlify
+from io import BytesIO
 from unittest import TestCase, skip
 
 import hashlib
@@ -29,8 +30,8 @@ def encode_base58(s):
         else:
             break
     prefix = b'1' * count
-    # convert from binary to hex, then hex to integer
-    num = int(hexlify(s), 16)
+    # convert from binary to integer
+    num = int.from_bytes(s, 'big')
     result = bytearray()
     while num > 0:
         num, mod = divmod(num, 58)
@@ -74,6 +75,67 @@ def int_to_little_endian(n, length):
     return n.to_bytes(length, byteorder='little')
 
 
+def read_bytes(s, length):
+    '''read_bytes reads exactly length bytes from a stream. Raises a
+    RuntimeError if the stream ends first'''
+    result = s.read(length)
+    if len(result) != length:
+        raise RuntimeError(
+            'stream ended after {} of {} bytes'.format(len(result), length))
+    return result
+
+
+def read_varint(s):
+    '''read_varint reads a CompactSize variable integer from a stream'''
+    i = read_bytes(s, 1)[0]
+    if i == 0xfd:
+        # 0xfd means the next two bytes are the number
+        return little_endian_to_int(read_bytes(s, 2))
+    elif i == 0xfe:
+        # 0xfe means the next four bytes are the number
+        return little_endian_to_int(read_bytes(s, 4))
+    elif i == 0xff:
+        # 0xff means the next eight bytes are the number
+        return little_endian_to_int(read_bytes(s, 8))
+    else:
+        # anything else is just the integer
+        return i
+
+
+# the number of bytes after the prefix byte, for the multi-byte varints
+VARINT_SIZES = {0xfd: 2, 0xfe: 4, 0xff: 8}
+
+
+def parse_varint(b, offset=0):
+    '''parse_varint reads a CompactSize variable integer from a byte
+    sequence at offset. Returns the integer and the offset just past it.
+    Raises a RuntimeError if the varint runs past the end'''
+    if offset >= len(b):
+        raise RuntimeError('no varint at offset {}'.format(offset))
+    i = b[offset]
+    size = VARINT_SIZES.get(i)
+    if size is None:
+        return i, offset + 1
+    end = offset + 1 + size
+    if end > len(b):
+        raise RuntimeError('varint at offset {} is truncated'.format(offset))
+    return little_endian_to_int(b[offset + 1:end]), end
+
+
+def encode_varint(i):
+    '''encodes an integer as a CompactSize variable integer'''
+    if i < 0xfd:
+        return bytes([i])
+    elif i < 0x10000:
+        return b'\xfd' + int_to_little_endian(i, 2)
+    elif i < 0x100000000:
+        return b'\xfe' + int_to_little_endian(i, 4)
+    elif i < 0x10000000000000000:
+        return b'\xff' + int_to_little_endian(i, 8)
+    else:
+        raise RuntimeError('integer too large: {}'.format(i))
+
+
 def h160_to_p2pkh_address(h160, testnet=False):
     '''Takes a byte sequence hash160 and returns a p2pkh address string'''
     # p2pkh has a prefix of b'\x00' for mainnet, b'\xef' for testnet
@@ -128,6 +190,34 @@ class HelperTest(TestCase):
         want = b'\x99\xc3\x98\x00\x00\x00\x00\x00'
         self.assertEqual(int_to_little_endian(n, 8), want)
 
+    def test_varint(self):
+        tests = [
+            (0, '00'),
+            (0xfc, 'fc'),
+            (0xfd, 'fdfd00'),
+            (0xffff, 'fdffff'),
+            (0x10000, 'fe00000100'),
+            (0xffffffff, 'feffffffff'),
+            (0x100000000, 'ff0000000001000000'),
+            (0xffffffffffffffff, 'ffffffffffffffffff'),
+        ]
+        for n, want in tests:
+            encoded = encode_varint(n)
+            self.assertEqual(hexlify(encoded).decode('ascii'), want)
+            s = BytesIO(encoded + b'\x01')
+            self.assertEqual(read_varint(s), n)
+            self.assertEqual(s.read(), b'\x01')
+            view = memoryview(b'\x01' + encoded + b'\x01')
+            self.assertEqual(parse_varint(view, 1), (n, 1 + len(encoded)))
+            # cut short anywhere, it's an error rather than a smaller number
+            for length in range(len(encoded)):
+                with self.assertRaises(RuntimeError):
+                    read_varint(BytesIO(encoded[:length]))
+                with self.assertRaises(RuntimeError):
+                    parse_varint(memoryview(encoded[:length]))
+        with self.assertRaises(RuntimeError):
+            encode_varint(0x10000000000000000)
+
     def test_p2pkh_address(self):
         h160 = unhexlify('74d691da1574e6b3c192ecfb52cc8984ee7b6c56')
         want = '1BenRpVUFK65JFWcQSuHnJKzc4M8ZP8Eqa'
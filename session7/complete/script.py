@@ -128,8 +128,16 @@ OP_CODES = {
 
 class Script:
 
+    __slots__ = ('_elements',)
+
     def __init__(self, elements):
-        self.elements = elements
+        # a tuple behind a read-only property, so a script can't change in
+        # place under the serializations and hashes transactions keep of it
+        self._elements = tuple(elements)
+
+    @property
+    def elements(self):
+        return self._elements
 
     def __repr__(self):
         result = ''
@@ -1,68 +1,203 @@
+from abc import ABC, abstractmethod
 from binascii import hexlify, unhexlify
-from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BufferedReader, BytesIO
+from operator import attrgetter
 from unittest import TestCase, skip
 
+import hashlib
+import json
+import os
 import requests
+import sqlite3
+import tempfile
+import threading
 
-from ecc import PrivateKey, S256Point, Signature
+from ecc import PrivateKey, S256Point, Signature, verify_batch
 from helper import (
     decode_base58,
     double_sha256,
+    encode_varint,
     int_to_little_endian,
     little_endian_to_int,
     p2pkh_script,
+    parse_varint,
+    read_bytes,
+    read_varint,
     SIGHASH_ALL,
 )
 from script import Script
 
 
+# Tx, TxIn and TxOut count assignments to their serialized fields, so a Tx
+# can check its memoized hashes against the sums of the counts without
+# walking its inputs and outputs in Python. scriptSigs are counted apart,
+# since sighashes blank them out
+field_mutations = attrgetter('_mutations')
+script_sig_mutations = attrgetter('_script_sig_mutations')
+
+
 class Tx:
 
+    # blocks and mempools hold a lot of these, so no per-instance __dict__
+    __slots__ = (
+        '_version', 'tx_ins', 'tx_outs', '_locktime', 'testnet',
+        '_sighash_cache', '_hash', '_hash_snapshot', '_mutations',
+    )
+
     def __init__(self, version, tx_ins, tx_outs, locktime, testnet=False):
-        self.version = version
-        self.tx_ins = tx_ins
-        self.tx_outs = tx_outs
-        self.locktime = locktime
+        # the slots are written directly, only later assignments are counted
+        self._version = version
+        # the mutation snapshots compare lists, which a tuple never equals
+        self.tx_ins = tx_ins if isinstance(tx_ins, list) else list(tx_ins)
+        self.tx_outs = tx_outs if isinstance(tx_outs, list) else list(tx_outs)
+        self._locktime = locktime
         self.testnet = testnet
+        self._mutations = 0
+        self._sighash_cache = None
+        # the memoized hash and the mutation snapshot it was taken at
+        self._hash = None
+        self._hash_snapshot = None
+
+    @property
+    def version(self):
+        return self._version
+
+    @version.setter
+    def version(self, version):
+        self._version = version
+        self._mutations += 1
+
+    @property
+    def locktime(self):
+        return self._locktime
+
+    @locktime.setter
+    def locktime(self, locktime):
+        self._locktime = locktime
+        self._mutations += 1
 
     @classmethod
     def parse(cls, s):
         '''Takes a byte stream and parses the transaction at the start
         return a Tx object
         '''
-        version = little_endian_to_int(s.read(4))
-        num_inputs = s.read(1)[0]
+        if isinstance(s, BytesIO):
+            # the whole buffer is already in memory, so parse it in place
+            # and move the stream past the transaction
+            tx, offset = cls.parse_view(memoryview(s.getvalue()), s.tell())
+            s.seek(offset)
+            return tx
+        version = little_endian_to_int(read_bytes(s, 4))
+        num_inputs = read_varint(s)
         tx_ins = []
         for _ in range(num_inputs):
             tx_ins.append(TxIn.parse(s))
-        num_outputs = s.read(1)[0]
+        num_outputs = read_varint(s)
         tx_outs = []
         for _ in range(num_outputs):
             tx_outs.append(TxOut.parse(s))
-        sequence = little_endian_to_int(s.read(4))
-        return cls(version, tx_ins, tx_outs, sequence)
+        locktime = little_endian_to_int(read_bytes(s, 4))
+        return cls(version, tx_ins, tx_outs, locktime)
+
+    @classmethod
+    def parse_view(cls, view, offset=0):
+        '''Takes a memoryview and parses the transaction starting at offset,
+        moving a cursor along instead of reading from a stream.
+        Returns the Tx object and the offset just past it
+        '''
+        start = offset
+        version = little_endian_to_int(view[offset:offset + 4])
+        num_inputs, offset = parse_varint(view, offset + 4)
+        tx_ins = []
+        for _ in range(num_inputs):
+            tx_in, offset = TxIn.parse_view(view, offset)
+            tx_ins.append(tx_in)
+        num_outputs, offset = parse_varint(view, offset)
+        tx_outs = []
+        for _ in range(num_outputs):
+            tx_out, offset = TxOut.parse_view(view, offset)
+            tx_outs.append(tx_out)
+        locktime = little_endian_to_int(view[offset:offset + 4])
+        offset += 4
+        # slices past the end come back short, so a truncated transaction
+        # shows up as a cursor past the end
+        if offset > len(view):
+            raise RuntimeError('transaction is truncated')
+        tx = cls(version, tx_ins, tx_outs, locktime)
+        # hashing the wire bytes now is cheaper than serializing later, and
+        # unlike a slice of them it doesn't keep the whole buffer alive
+        tx._hash = double_sha256(view[start:offset])[::-1]
+        tx._hash_snapshot = tx._mutation_snapshot()
+        return tx, offset
 
     def serialize(self):
         '''Returns the byte serialization of the transaction'''
+        # the parts are joined once at the end, since adding bytes one part
+        # at a time copies everything so far on each addition
         # version
-        result = int_to_little_endian(self.version, 4)
+        result = [int_to_little_endian(self._version, 4)]
         # inputs
-        result += bytes([len(self.tx_ins)])
+        result.append(encode_varint(len(self.tx_ins)))
         for tx_in in self.tx_ins:
-            result += tx_in.serialize()
+            result.append(tx_in.serialize())
         # outputs
-        result += bytes([len(self.tx_outs)])
+        result.append(encode_varint(len(self.tx_outs)))
         for tx_out in self.tx_outs:
-            result += tx_out.serialize()
+            result.append(tx_out.serialize())
         # locktime
-        result += int_to_little_endian(self.locktime, 4)
-        return result
+        result.append(int_to_little_endian(self._locktime, 4))
+        return b''.join(result)
+
+    def _field_mutations(self):
+        return self._mutations \
+            + sum(map(field_mutations, self.tx_ins)) \
+            + sum(map(field_mutations, self.tx_outs))
+
+    def _mutation_snapshot(self):
+        '''Returns the mutation counts and copies of the input and output
+        lists, for memoized values to be checked against. Take it before
+        serializing, the setters count after assigning'''
+        return (
+            self._field_mutations(),
+            sum(map(script_sig_mutations, self.tx_ins)),
+            self.tx_ins[:], self.tx_outs[:],
+        )
+
+    def _changed_since(self, snapshot, script_sigs=True):
+        '''Returns whether the serialization may have changed since snapshot
+        was taken. The lists are compared by identity of their items and the
+        counts are summed, all in C, so this costs no Python work per input
+        or output'''
+        if snapshot is None:
+            return True
+        fields, sigs, tx_ins, tx_outs = snapshot
+        return tx_ins != self.tx_ins \
+            or tx_outs != self.tx_outs \
+            or fields != self._field_mutations() \
+            or (script_sigs and sigs != sum(map(script_sig_mutations, self.tx_ins)))
+
+    def hash(self):
+        '''Returns the double-sha256 interpreted little endian of the
+        transaction. Parsing computes it from the wire bytes, and it's
+        memoized until a field, an input or an output changes
+        '''
+        if self._hash is None or self._changed_since(self._hash_snapshot):
+            self._hash_snapshot = self._mutation_snapshot()
+            self._hash = double_sha256(self.serialize())[::-1]
+        return self._hash
+
+    def id(self):
+        '''Returns the transaction id, the hash in hex'''
+        return hexlify(self.hash()).decode('ascii')
 
     def fee(self):
         '''Returns the fee of this transaction in satoshi'''
         input_sum = 0
-        for tx_in in self.tx_ins:
-            input_sum += tx_in.value(self.testnet)
+        # look up all the outputs being spent in one go
+        for outpoint in outpoints(self.tx_ins, self.testnet):
+            input_sum += outpoint['value']
         output_sum = 0
         for tx_out in self.tx_outs:
             output_sum += tx_out.amount
@@ -71,55 +206,61 @@ class Tx:
     def hash_to_sign(self, input_index, sighash):
         '''Returns the integer representation of the hash that needs to get
         signed for index input_index'''
-        # create a transaction serialization where
-        # all the input script_sigs are blanked out
-        alt_tx_ins = []
-        for tx_in in self.tx_ins:
-            alt_tx_ins.append(TxIn(
-                prev_tx=tx_in.prev_tx,
-                prev_index=tx_in.prev_index,
-                script_sig=b'',
-                sequence=tx_in.sequence,
-            ))
         # determine how we need to sign from the scriptPubKey
-        signing_input = alt_tx_ins[input_index]
-        script_pubkey = Script.parse(signing_input.script_pubkey(self.testnet))
+        current_input = self.tx_ins[input_index]
+        script_pubkey = Script.parse(current_input.script_pubkey(self.testnet))
         sig_type = script_pubkey.type()
         if sig_type == 'p2pkh':
             # replace the input's scriptSig with the scriptPubKey
-            signing_input.script_sig = script_pubkey
+            script_code = script_pubkey
         elif sig_type == 'p2sh':
             # replace the input's scriptSig with the RedeemScript
-            current_input = self.tx_ins[input_index]
-            signing_input.script_sig = Script.parse(
-                current_input.redeem_script())
+            script_code = Script.parse(current_input.redeem_script())
         else:
             raise RuntimeError('no valid sig_type')
-        alt_tx = self.__class__(
-            version=self.version,
-            tx_ins=alt_tx_ins,
-            tx_outs=self.tx_outs,
-            locktime=self.locktime)
-        # add the sighash
-        result = alt_tx.serialize() + int_to_little_endian(sighash, 4)
-        return int.from_bytes(double_sha256(result), 'big')
+        # everything but the signing input's scriptSig is the same for
+        # every input, so that part comes from the cache
+        return self.sighash_cache().hash_to_sign(
+            input_index, script_code.serialize(), sighash)
 
-    def verify_input(self, input_index):
-        '''Returns whether the input has a valid signature'''
+    def sighash_cache(self):
+        '''Returns the SighashCache for the transaction as it is now. The
+        cache is kept between calls and rebuilt when a field it depends on
+        may have changed. scriptSigs are blanked out, so changing them
+        doesn't count'''
+        cache = self._sighash_cache
+        if cache is None or self._changed_since(cache.snapshot, script_sigs=False):
+            cache = self._sighash_cache = SighashCache(self)
+        return cache
+
+    def signature_checks(self, input_index):
+        '''Returns a (sec, der, z) triple for each signature the input
+        needs to have checked'''
         inp = self.tx_ins[input_index]
-        sigs_required = inp.script_sig.num_sigs_required()
-        for sig_num in range(sigs_required):
-            # get the point from the sec format
-            point = S256Point.parse(inp.sec_pubkey(index=sig_num))
+        checks = []
+        for sig_num in range(inp.script_sig.num_sigs_required()):
             # get the input signature
             der, sighash = inp.der_signature(index=sig_num)
-            signature = Signature.parse(der)
             # get the hash to sign
             z = self.hash_to_sign(input_index, sighash)
-            # verify the hash and signature are good
-            if not point.verify(z, signature):
-                return False
-        return True
+            checks.append((inp.sec_pubkey(index=sig_num), der, z))
+        return checks
+
+    def verify_input(self, input_index):
+        '''Returns whether the input has a valid signature'''
+        return all(verify_signatures(self.signature_checks(input_index)))
+
+    def verify_all_inputs(self, parallel=None):
+        '''Returns whether each input has a valid signature, in input order.
+        With parallel set, the signatures are checked by a pool of that
+        many worker processes
+        '''
+        checks = [self.signature_checks(i) for i in range(len(self.tx_ins))]
+        return verify_check_groups(checks, parallel=parallel)
+
+    def verify(self, parallel=None):
+        '''Returns whether every input has a valid signature'''
+        return all(self.verify_all_inputs(parallel=parallel))
 
     def sign_input(self, input_index, private_key, sighash):
         '''Signs the input using the private key'''
@@ -130,7 +271,7 @@ class Tx:
         # append the sighash, most likely SIGHASH_ALL
         sig = der + bytes([sighash])
         # add the sec
-        sec = unhexlify(private_key.point.sec())
+        sec = private_key.point.sec_bytes()
         # construct script_sig
         script_sig = bytes([len(sig)]) + sig + bytes([len(sec)]) + sec
         # change input's script_sig
@@ -162,13 +303,391 @@ class Tx:
 CACHE = {'75d7454b7010fa28b00f16cccb640b1756fd6e357c03a3b81b9d119505f47b56:0': {'spent_by': 'ee51510d7bbabe28052038d1deb10c03ec74f06a79e21913c6fcf48d56217c87', 'script_type': 'pay-to-pubkey-hash', 'value': 1043341, 'addresses': ['1KhAyQ3kaRQptGwAZghHBjNg65dgGdDXak'], 'script': '76a914cd0b3a22cd16e182291aa2708c41cb38de5a330788ac'}, 'd37f9e7282f81b7fd3af0fde8b462a1c28024f1d83cf13637ec18d03f4518fe:0': {'spent_by': 'ee51510d7bbabe28052038d1deb10c03ec74f06a79e21913c6fcf48d56217c87', 'script_type': 'pay-to-pubkey-hash', 'value': 29960102, 'addresses': ['1Gy5Djegn51WxHQN4X19FBsUy8RQ74hvYo'], 'script': '76a914af24b3f3e987c23528b366122a7ed2af199b36bc88ac'}, 'd37f9e7282f81b7fd3af0fde8b462a1c28024f1d83cf13637ec18d03f4518feb:0': {'spent_by': 'ee51510d7bbabe28052038d1deb10c03ec74f06a79e21913c6fcf48d56217c87', 'script_type': 'pay-to-pubkey-hash', 'value': 29960102, 'addresses': ['1Gy5Djegn51WxHQN4X19FBsUy8RQ74hvYo'], 'script': '76a914af24b3f3e987c23528b366122a7ed2af199b36bc88ac'}, '0025bc3c0fa8b7eb55b9437fdbd016870d18e0df0ace7bc9864efc38414147c8:0': {'script_type': 'pay-to-pubkey-hash', 'value': 110000000, 'addresses': ['mzx5YhAH9kNHtcN481u6WkjeHjYtVeKVh2'], 'script': '76a914d52ad7ca9b3d096a38e752c2018e6fbc40cdf26f88ac'}, 'd1c789a9c60383bf715f3f6ad9d14b91fe55f3deb369fe5d9280cb1a01793f81:0': {'spent_by': '452c629d67e41baec3ac6f04fe744b4b9617f8f859c63b3002f8684e7a4fee03', 'script_type': 'pay-to-pubkey-hash', 'value': 42505594, 'addresses': ['1GKN6gJBgvet8S92qiQjVxEaVJ5eoJE9s2'], 'script': '76a914a802fc56c704ce87c42d7c92eb75e7896bdc41ae88ac'}, '9e067aedc661fca148e13953df75f8ca6eada9ce3b3d8d68631769ac60999156:1': {'spent_by': 'ee51510d7bbabe28052038d1deb10c03ec74f06a79e21913c6fcf48d56217c87', 'script_type': 'pay-to-pubkey-hash', 'value': 800000, 'addresses': ['1ARzh3A5fgGzbaXkg3novtH8AopzojY79D'], 'script': '76a914677345c7376dfda2c52ad9b6a153b643b6409a3788ac'}, '22874d30bde689475e1df03608aa85a3c7b01e18f8d53aedc1b6df6ded788286:26': {'spent_by': '46df1a9484d0a81d03ce0ee543ab6e1a23ed06175c104a178268fad381216c2b', 'script_type': 'pay-to-script-hash', 'value': 50000000, 'addresses': ['3CLoMMyuoDQTPRD3XYZtCvgvkadrAdvdXh'], 'script': 'a91474d691da1574e6b3c192ecfb52cc8984ee7b6c5687'}, '45f3f79066d251addc04fd889f776c73afab1cb22559376ff820e6166c5e3ad6:1': {'spent_by': 'ee51510d7bbabe28052038d1deb10c03ec74f06a79e21913c6fcf48d56217c87', 'script_type': 'pay-to-pubkey-hash', 'value': 9337330, 'addresses': ['15UecwTDg57tnfSM6Cra8cmZVYavxtTZp2'], 'script': '76a914311b232c3400080eb2636edb8548b47f6835be7688ac'}}
 
 
+
+class OutpointStore(ABC):
+    '''Where the outputs spent by transaction inputs are kept. Keys are
+    (prev_tx, prev_index) with prev_tx as 32 bytes, and each output is the
+    dict blockcypher.com returns for it
+    '''
+
+    @abstractmethod
+    def get(self, key):
+        '''Returns the output for key, or None if it isn't stored'''
+
+    @abstractmethod
+    def put(self, key, output):
+        '''Stores the output for key'''
+
+    def batch_get(self, keys):
+        '''Returns the output or None for each of keys, in order'''
+        return [self.get(key) for key in keys]
+
+    def close(self):
+        '''Releases whatever the store holds open'''
+
+
+class SqliteOutpointStore(OutpointStore):
+    '''Outputs kept in a sqlite3 database, so they outlive the process.
+    One connection is shared by all threads, behind a lock'''
+
+    # two parameters a key, under the oldest sqlite limit of 999
+    BATCH_SIZE = 400
+
+    def __init__(self, path, seed=None):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS outpoints ('
+            'prev_tx BLOB, prev_index INTEGER, output TEXT, '
+            'PRIMARY KEY (prev_tx, prev_index))')
+        if seed:
+            # existing rows may be fresher than the seed data
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO outpoints VALUES (?, ?, ?)',
+                [(prev_tx, prev_index, json.dumps(output))
+                 for (prev_tx, prev_index), output in seed.items()])
+        self.connection.commit()
+
+    def get(self, key):
+        return self.batch_get([key])[0]
+
+    def put(self, key, output):
+        prev_tx, prev_index = key
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO outpoints VALUES (?, ?, ?)',
+                (prev_tx, prev_index, json.dumps(output)))
+            self.connection.commit()
+
+    def batch_get(self, keys):
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), self.BATCH_SIZE):
+            chunk = keys[start:start + self.BATCH_SIZE]
+            query = 'SELECT prev_tx, prev_index, output FROM outpoints WHERE ' \
+                + ' OR '.join(['(prev_tx = ? AND prev_index = ?)'] * len(chunk))
+            params = [value for key in chunk for value in key]
+            with self.lock:
+                rows = self.connection.execute(query, params).fetchall()
+            for prev_tx, prev_index, output in rows:
+                found[(prev_tx, prev_index)] = json.loads(output)
+        return [found.get(key) for key in keys]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+OUTPOINT_CACHE_SIZE = 10000
+
+
+class LRUOutpointStore(OutpointStore):
+    '''A bounded in-process cache of the most recently used outputs in
+    front of another store. The cache is guarded by a lock, calls to the
+    other store are made outside of it'''
+
+    def __init__(self, store, size=OUTPOINT_CACHE_SIZE):
+        self.store = store
+        self.size = size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _remember(self, key, output):
+        # callers hold the lock
+        self.cache[key] = output
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.size:
+            self.cache.popitem(last=False)
+
+    def get(self, key):
+        return self.batch_get([key])[0]
+
+    def put(self, key, output):
+        self.store.put(key, output)
+        with self.lock:
+            self._remember(key, output)
+
+    def batch_get(self, keys):
+        keys = list(keys)
+        results = []
+        missing = []
+        with self.lock:
+            for key in keys:
+                output = self.cache.get(key)
+                if output is None:
+                    missing.append(key)
+                else:
+                    self.cache.move_to_end(key)
+                results.append(output)
+        if missing:
+            found = dict(zip(missing, self.store.batch_get(missing)))
+            with self.lock:
+                for i, key in enumerate(keys):
+                    if results[i] is None and found[key] is not None:
+                        results[i] = found[key]
+                        self._remember(key, found[key])
+        return results
+
+    def close(self):
+        self.store.close()
+
+
+def default_outpoint_db():
+    '''Returns where the default outpoint store lives: OUTPOINT_DB in the
+    environment, or else a directory in the user's cache directory that
+    only they can read or write'''
+    path = os.environ.get('OUTPOINT_DB')
+    if path:
+        return path
+    cache_home = os.environ.get('XDG_CACHE_HOME') \
+        or os.path.join(os.path.expanduser('~'), '.cache')
+    directory = os.path.join(cache_home, 'pb-exercises')
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    # makedirs leaves an existing directory's mode alone
+    os.chmod(directory, 0o700)
+    return os.path.join(directory, 'outpoints.sqlite3')
+
+
+OUTPOINT_STORE = None
+OUTPOINT_STORE_LOCK = threading.Lock()
+
+
+def get_outpoint_store(path=None):
+    '''Returns the outpoint store in use. Unless one was set, the first
+    call creates an LRUOutpointStore in front of a SqliteOutpointStore
+    seeded with CACHE, at path or else at default_outpoint_db(). path can
+    only be given while there's no store yet
+    '''
+    global OUTPOINT_STORE
+    with OUTPOINT_STORE_LOCK:
+        if OUTPOINT_STORE is not None and path is not None:
+            raise RuntimeError('the outpoint store already exists, path would be ignored')
+        if OUTPOINT_STORE is None:
+            seed = {}
+            for cache_key, output in CACHE.items():
+                tx_hash, prev_index = cache_key.split(':')
+                # skip keys that aren't a full transaction hash
+                if len(tx_hash) == 64:
+                    seed[(unhexlify(tx_hash), int(prev_index))] = output
+            if path is None:
+                path = default_outpoint_db()
+            OUTPOINT_STORE = LRUOutpointStore(SqliteOutpointStore(path, seed))
+        return OUTPOINT_STORE
+
+
+def set_outpoint_store(store):
+    '''Sets the outpoint store used by TxIn.outpoint and Tx.fee'''
+    global OUTPOINT_STORE
+    with OUTPOINT_STORE_LOCK:
+        OUTPOINT_STORE = store
+
+
+def fetch_outpoint(prev_tx, prev_index, testnet=False):
+    '''Returns the output from blockcypher.com'''
+    if testnet:
+        net = 'test3'
+    else:
+        net = 'main'
+    url = 'https://api.blockcypher.com/v1/btc/{}/txs/{}?token=41298c19cc85400da2f1aa620578b096&outstart=0&limit={}'.format(
+        net, hexlify(prev_tx).decode('ascii'), prev_index + 1)
+    tx_json = requests.get(url).json()
+    if 'outputs' not in tx_json:
+        raise RuntimeError('received {}'.format(tx_json))
+    return tx_json['outputs'][prev_index]
+
+
+def outpoints(tx_ins, testnet=False):
+    '''Returns the output each of tx_ins spends, in order. They're looked
+    up in the outpoint store together, and the ones it doesn't have are
+    fetched and stored'''
+    store = get_outpoint_store()
+    keys = [(tx_in.prev_tx, tx_in.prev_index) for tx_in in tx_ins]
+    results = store.batch_get(keys)
+    fetched = {}
+    for i, key in enumerate(keys):
+        if results[i] is None:
+            if key not in fetched:
+                fetched[key] = fetch_outpoint(key[0], key[1], testnet)
+                store.put(key, fetched[key])
+            results[i] = fetched[key]
+    return results
+
+
+class SighashCache:
+    '''The parts of the signature hash serialization that are shared by all
+    the inputs of a transaction: each input with its scriptSig blanked out,
+    the outputs and the locktime, and a sha256 state for every prefix of the
+    blanked inputs.
+
+    Legacy sighashes still hash every blanked input after the signing one,
+    so signing all n inputs hashes O(n^2) bytes. The cache removes the
+    per-input object building and serialization around that hashing.
+    '''
+
+    # prev_tx, prev_index, an empty scriptSig and the sequence
+    BLANK_INPUT_LENGTH = 32 + 4 + 1 + 4
+
+    def __init__(self, tx):
+        self.snapshot = tx._mutation_snapshot()
+        self.blank_inputs = b''.join(
+            tx_in.prev_tx[::-1]
+            + int_to_little_endian(tx_in.prev_index, 4)
+            + b'\x00'
+            + int_to_little_endian(tx_in.sequence, 4)
+            for tx_in in tx.tx_ins
+        )
+        result = [encode_varint(len(tx.tx_outs))]
+        for tx_out in tx.tx_outs:
+            result.append(tx_out.serialize())
+        result.append(int_to_little_endian(tx.locktime, 4))
+        self.outputs_and_locktime = b''.join(result)
+        # prefix_states[i] has hashed the version, the input count and the
+        # first i blanked inputs
+        state = hashlib.sha256(
+            int_to_little_endian(tx.version, 4) + encode_varint(len(tx.tx_ins)))
+        self.prefix_states = [state]
+        blank_inputs = memoryview(self.blank_inputs)
+        for start in range(0, len(blank_inputs), self.BLANK_INPUT_LENGTH):
+            state = state.copy()
+            state.update(blank_inputs[start:start + self.BLANK_INPUT_LENGTH])
+            self.prefix_states.append(state)
+
+    def hash_to_sign(self, input_index, script_code, sighash):
+        '''Returns the signature hash for input_index as an integer, with
+        script_code as that input's scriptSig'''
+        start = input_index * self.BLANK_INPUT_LENGTH
+        end = start + self.BLANK_INPUT_LENGTH
+        blank_inputs = memoryview(self.blank_inputs)
+        h = self.prefix_states[input_index].copy()
+        # the signing input, with script_code in place of the empty scriptSig
+        h.update(blank_inputs[start:start + 36])
+        h.update(encode_varint(len(script_code)) + script_code)
+        h.update(blank_inputs[end - 4:end])
+        # the rest of the transaction
+        h.update(blank_inputs[end:])
+        h.update(self.outputs_and_locktime)
+        h.update(int_to_little_endian(sighash, 4))
+        return int.from_bytes(hashlib.sha256(h.digest()).digest(), 'big')
+
+
+def verify_signatures(checks):
+    '''Takes a list of (sec, der, z) triples and returns whether each
+    signature is valid. Only bytes and ints go in and out, so this is
+    what gets sent to worker processes
+    '''
+    items = [
+        (S256Point.parse(sec), z, Signature.parse(der))
+        for sec, der, z in checks
+    ]
+    return verify_batch(items)
+
+
+def verify_check_groups(groups, parallel=None):
+    '''Takes a list of lists of (sec, der, z) triples and returns, for each
+    list, whether all of its signatures are valid. With parallel set, the
+    checks are split into chunks over a pool of that many processes
+    '''
+    checks = [check for group in groups for check in group]
+    if parallel and len(checks) > 1:
+        # a few chunks per process evens out the load without paying
+        # for a round trip per signature
+        chunk_size = max(1, -(-len(checks) // (4 * parallel)))
+        chunks = [
+            checks[i:i + chunk_size]
+            for i in range(0, len(checks), chunk_size)
+        ]
+        with ProcessPoolExecutor(parallel) as executor:
+            results = [
+                result
+                for chunk_results in executor.map(verify_signatures, chunks)
+                for result in chunk_results
+            ]
+    else:
+        results = verify_signatures(checks)
+    results = iter(results)
+    return [all([next(results) for _ in group]) for group in groups]
+
+
+def verify_transactions(txs, parallel=None):
+    '''Returns whether every input of each transaction in txs has a valid
+    signature, in the same order as txs. The signatures of all the
+    transactions are checked together, so a block's worth can share a pool
+    '''
+    groups = []
+    for tx in txs:
+        groups.append([
+            check
+            for i in range(len(tx.tx_ins))
+            for check in tx.signature_checks(i)
+        ])
+    return verify_check_groups(groups, parallel=parallel)
+
+
 class TxIn:
 
+    __slots__ = (
+        '_prev_tx', '_prev_index', '_sequence',
+        '_script_sig', '_raw_script_sig', '_mutations', '_script_sig_mutations',
+    )
+
     def __init__(self, prev_tx, prev_index, script_sig, sequence):
-        self.prev_tx = prev_tx
-        self.prev_index = prev_index
-        self.script_sig = Script.parse(script_sig)
-        self.sequence = sequence
+        # the slots are written directly, only later assignments are counted
+        self._prev_tx = prev_tx
+        self._prev_index = prev_index
+        self._set_script_sig(script_sig)
+        self._sequence = sequence
+        self._mutations = 0
+        self._script_sig_mutations = 0
+
+    @property
+    def prev_tx(self):
+        return self._prev_tx
+
+    @prev_tx.setter
+    def prev_tx(self, prev_tx):
+        self._prev_tx = prev_tx
+        self._mutations += 1
+
+    @property
+    def prev_index(self):
+        return self._prev_index
+
+    @prev_index.setter
+    def prev_index(self, prev_index):
+        self._prev_index = prev_index
+        self._mutations += 1
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    @sequence.setter
+    def sequence(self, sequence):
+        self._sequence = sequence
+        self._mutations += 1
+
+    @property
+    def script_sig(self):
+        '''The scriptSig as a Script, decoded on first access'''
+        if self._script_sig is None:
+            self._script_sig = Script.parse(self._raw_script_sig)
+        return self._script_sig
+
+    @script_sig.setter
+    def script_sig(self, script_sig):
+        self._set_script_sig(script_sig)
+        self._script_sig_mutations += 1
+
+    def _set_script_sig(self, script_sig):
+        # raw bytes are kept as they are and only decoded when needed. The
+        # raw bytes are what gets serialized until a Script replaces them,
+        # which is safe since a decoded Script can't be changed in place
+        if isinstance(script_sig, Script):
+            self._raw_script_sig = None
+            self._script_sig = script_sig
+        else:
+            self._raw_script_sig = script_sig
+            self._script_sig = None
 
     @classmethod
     def parse(cls, s):
@@ -176,41 +695,49 @@ class TxIn:
         return a TxIn object
         '''
         # previous tx is little endian
-        prev_tx = s.read(32)[::-1]
-        prev_index = little_endian_to_int(s.read(4))
-        script_sig_length = s.read(1)[0]
-        script_sig = s.read(script_sig_length)
-        sequence = little_endian_to_int(s.read(4))
+        prev_tx = read_bytes(s, 32)[::-1]
+        prev_index = little_endian_to_int(read_bytes(s, 4))
+        script_sig_length = read_varint(s)
+        script_sig = read_bytes(s, script_sig_length)
+        sequence = little_endian_to_int(read_bytes(s, 4))
         return cls(prev_tx, prev_index, script_sig, sequence)
 
+    @classmethod
+    def parse_view(cls, view, offset):
+        '''Takes a memoryview and parses the tx_input starting at offset.
+        Returns the TxIn object and the offset just past it
+        '''
+        # previous tx is little endian
+        prev_tx = bytes(view[offset:offset + 32])[::-1]
+        prev_index = little_endian_to_int(view[offset + 32:offset + 36])
+        script_sig_length, offset = parse_varint(view, offset + 36)
+        # a memoryview slice takes more memory than a copy of a typical
+        # script, and would keep the whole buffer alive
+        script_sig = bytes(view[offset:offset + script_sig_length])
+        offset += script_sig_length
+        sequence = little_endian_to_int(view[offset:offset + 4])
+        return cls(prev_tx, prev_index, script_sig, sequence), offset + 4
+
     def serialize(self):
         '''Returns the byte serialization of the transaction input'''
         # tx, prev_tx is little-endian!
-        result = self.prev_tx[::-1] + int_to_little_endian(self.prev_index, 4)
+        result = self._prev_tx[::-1] + int_to_little_endian(self._prev_index, 4)
         # script_sig
-        serialized_script_sig = self.script_sig.serialize()
-        result += bytes([len(serialized_script_sig)]) + serialized_script_sig
+        serialized_script_sig = self._raw_script_sig
+        if serialized_script_sig is None:
+            serialized_script_sig = self._script_sig.serialize()
         # sequence
-        result += int_to_little_endian(self.sequence, 4)
-        return result
+        return b''.join((
+            result,
+            encode_varint(len(serialized_script_sig)),
+            serialized_script_sig,
+            int_to_little_endian(self._sequence, 4),
+        ))
 
     def outpoint(self, testnet=False):
-        cache_key = '{}:{}'.format(
-            hexlify(self.prev_tx).decode('ascii'), self.prev_index)
-        cache = CACHE.get(cache_key)
-        if cache:
-            return cache
-        if testnet:
-            net = 'test3'
-        else:
-            net = 'main'
-        url = 'https://api.blockcypher.com/v1/btc/{}/txs/{}?token=41298c19cc85400da2f1aa620578b096&outstart=0&limit={}'.format(
-            net, hexlify(self.prev_tx).decode('ascii'), self.prev_index + 1)
-        tx_json = requests.get(url).json()
-        if 'outputs' not in tx_json:
-            raise RuntimeError('received {}'.format(tx_json))
-        CACHE[cache_key] = tx_json['outputs'][self.prev_index]
-        return CACHE[cache_key]
+        '''Returns the output this input spends, from the outpoint store or
+        else from blockcypher.com'''
+        return outpoints([self], testnet)[0]
 
     def value(self, testnet=False):
         '''tx_hash is a hex version of tx, index is an integer
@@ -250,32 +777,216 @@ class TxIn:
 
 class TxOut:
 
+    __slots__ = ('_amount', '_script_pubkey', '_raw_script_pubkey', '_mutations')
+
     def __init__(self, amount, script_pubkey):
-        self.amount = amount
-        self.script_pubkey = Script.parse(script_pubkey)
+        # same as TxIn
+        self._amount = amount
+        self._set_script_pubkey(script_pubkey)
+        self._mutations = 0
+
+    @property
+    def amount(self):
+        return self._amount
+
+    @amount.setter
+    def amount(self, amount):
+        self._amount = amount
+        self._mutations += 1
+
+    @property
+    def script_pubkey(self):
+        '''The scriptPubKey as a Script, decoded on first access'''
+        if self._script_pubkey is None:
+            self._script_pubkey = Script.parse(self._raw_script_pubkey)
+        return self._script_pubkey
+
+    @script_pubkey.setter
+    def script_pubkey(self, script_pubkey):
+        self._set_script_pubkey(script_pubkey)
+        self._mutations += 1
+
+    def _set_script_pubkey(self, script_pubkey):
+        # same as TxIn._set_script_sig
+        if isinstance(script_pubkey, Script):
+            self._raw_script_pubkey = None
+            self._script_pubkey = script_pubkey
+        else:
+            self._raw_script_pubkey = script_pubkey
+            self._script_pubkey = None
 
     @classmethod
     def parse(cls, s):
         '''Takes a byte stream and parses the tx_output at the start
         return a TxOut object
         '''
-        amount = little_endian_to_int(s.read(8))
-        script_pubkey_length = s.read(1)[0]
-        script_pubkey = s.read(script_pubkey_length)
+        amount = little_endian_to_int(read_bytes(s, 8))
+        script_pubkey_length = read_varint(s)
+        script_pubkey = read_bytes(s, script_pubkey_length)
         return cls(amount, script_pubkey)
 
+    @classmethod
+    def parse_view(cls, view, offset):
+        '''Takes a memoryview and parses the tx_output starting at offset.
+        Returns the TxOut object and the offset just past it
+        '''
+        amount = little_endian_to_int(view[offset:offset + 8])
+        script_pubkey_length, offset = parse_varint(view, offset + 8)
+        script_pubkey = bytes(view[offset:offset + script_pubkey_length])
+        offset += script_pubkey_length
+        return cls(amount, script_pubkey), offset
+
     def serialize(self):
         '''Returns the byte serialization of the transaction output'''
         # amount
-        result = int_to_little_endian(self.amount, 8)
+        result = int_to_little_endian(self._amount, 8)
         # pubkey
-        serialized_script_pubkey = self.script_pubkey.serialize()
-        result += bytes([len(serialized_script_pubkey)]) + serialized_script_pubkey
-        return result
+        serialized_script_pubkey = self._raw_script_pubkey
+        if serialized_script_pubkey is None:
+            serialized_script_pubkey = self._script_pubkey.serialize()
+        return b''.join((
+            result,
+            encode_varint(len(serialized_script_pubkey)),
+            serialized_script_pubkey,
+        ))
+
+
+class OutpointStoreTest(TestCase):
+
+    class CountingOutpointStore(OutpointStore):
+        '''A dict based store that counts the keys asked for'''
+
+        def __init__(self):
+            self.outputs = {}
+            self.lookups = 0
+
+        def get(self, key):
+            self.lookups += 1
+            return self.outputs.get(key)
+
+        def put(self, key, output):
+            self.outputs[key] = output
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            OutpointStore()
+
+    def test_sqlite(self):
+        a, b, c = (b'\xaa' * 32, 0), (b'\xaa' * 32, 1), (b'\xbb' * 32, 0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'outpoints.sqlite3')
+            store = SqliteOutpointStore(path, seed={a: {'value': 1}})
+            self.assertEqual(store.get(a), {'value': 1})
+            self.assertIsNone(store.get(b))
+            store.put(b, {'value': 2})
+            keys = [c, b, a] * 300
+            self.assertEqual(store.batch_get(keys), [None, {'value': 2}, {'value': 1}] * 300)
+            store.close()
+            # the outputs are still there for the next process, and the seed
+            # doesn't overwrite them
+            store = SqliteOutpointStore(path, seed={a: {'value': 5}})
+            self.assertEqual(store.batch_get([a, b]), [{'value': 1}, {'value': 2}])
+            store.close()
+
+    def test_lru(self):
+        backing = self.CountingOutpointStore()
+        store = LRUOutpointStore(backing, size=2)
+        keys = [(bytes([i]) * 32, 0) for i in range(3)]
+        for i, key in enumerate(keys):
+            backing.put(key, {'value': i})
+        self.assertEqual(store.batch_get(keys[:2]), [{'value': 0}, {'value': 1}])
+        self.assertEqual(backing.lookups, 2)
+        # hits don't reach the backing store
+        self.assertEqual(store.get(keys[0]), {'value': 0})
+        self.assertEqual(backing.lookups, 2)
+        # keys[1] is the least recently used, so it makes room for keys[2]
+        self.assertEqual(store.get(keys[2]), {'value': 2})
+        self.assertEqual(list(store.cache), [keys[0], keys[2]])
+        store.put(keys[1], {'value': 4})
+        self.assertEqual(backing.outputs[keys[1]], {'value': 4})
+        self.assertEqual(list(store.cache), [keys[2], keys[1]])
+        self.assertIsNone(store.get((b'\xff' * 32, 0)))
+
+    def test_threads(self):
+        keys = [(bytes([i]) * 32, 0) for i in range(8)]
+        seed = {key: {'value': i} for i, key in enumerate(keys)}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'outpoints.sqlite3')
+            store = LRUOutpointStore(SqliteOutpointStore(path, seed), size=4)
+            with ThreadPoolExecutor(4) as executor:
+                # a lookup from a thread other than the one that connected
+                self.assertEqual(executor.submit(store.store.get, keys[0]).result(), {'value': 0})
+                results = executor.map(store.get, keys * 50)
+                self.assertEqual(list(results), [{'value': i} for i in range(8)] * 50)
+                executor.submit(store.put, keys[0], {'value': 9}).result()
+            self.assertEqual(store.store.get(keys[0]), {'value': 9})
+            self.assertLessEqual(len(store.cache), 4)
+            store.close()
+
+    def test_outpoints(self):
+        previous = OUTPOINT_STORE
+        store = self.CountingOutpointStore()
+        set_outpoint_store(store)
+        try:
+            prev_tx = b'\x01' * 32
+            store.put((prev_tx, 0), {'value': 100, 'script': '51'})
+            store.put((prev_tx, 1), {'value': 200, 'script': '52'})
+            tx_ins = [TxIn(prev_tx, i, b'', 0) for i in range(2)]
+            self.assertEqual(tx_ins[1].value(), 200)
+            self.assertEqual(tx_ins[0].script_pubkey(), b'\x51')
+            tx = Tx(1, tx_ins, [TxOut(250, b'')], 0)
+            self.assertEqual(tx.fee(), 50)
+        finally:
+            set_outpoint_store(previous)
+
+    def test_seeded_from_cache(self):
+        previous = OUTPOINT_STORE
+        with tempfile.TemporaryDirectory() as directory:
+            set_outpoint_store(None)
+            try:
+                store = get_outpoint_store(os.path.join(directory, 'outpoints.sqlite3'))
+                key = (unhexlify('d1c789a9c60383bf715f3f6ad9d14b91fe55f3deb369fe5d9280cb1a01793f81'), 0)
+                self.assertEqual(store.get(key)['value'], 42505594)
+                self.assertIs(get_outpoint_store(), store)
+                with self.assertRaises(RuntimeError):
+                    get_outpoint_store(os.path.join(directory, 'other.sqlite3'))
+                store.close()
+            finally:
+                set_outpoint_store(previous)
+
+    def test_default_outpoint_db(self):
+        environ = dict(os.environ)
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                os.environ.pop('OUTPOINT_DB', None)
+                os.environ['XDG_CACHE_HOME'] = directory
+                path = default_outpoint_db()
+                self.assertEqual(os.path.dirname(os.path.dirname(path)), directory)
+                # only the user can get at the directory
+                self.assertEqual(os.stat(os.path.dirname(path)).st_mode & 0o777, 0o700)
+                os.environ['OUTPOINT_DB'] = os.path.join(directory, 'elsewhere.sqlite3')
+                self.assertEqual(default_outpoint_db(), os.environ['OUTPOINT_DB'])
+            finally:
+                os.environ.clear()
+                os.environ.update(environ)
 
 
 class TxTest(TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        # keep the default store out of the user's cache directory
+        cls.previous_store = OUTPOINT_STORE
+        cls.directory = tempfile.TemporaryDirectory()
+        set_outpoint_store(None)
+        get_outpoint_store(os.path.join(cls.directory.name, 'outpoints.sqlite3'))
+
+    @classmethod
+    def tearDownClass(cls):
+        get_outpoint_store().close()
+        set_outpoint_store(cls.previous_store)
+        cls.directory.cleanup()
+
     def test_parse_version(self):
         raw_tx = unhexlify('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
         stream = BytesIO(raw_tx)
@@ -336,6 +1047,108 @@ class TxTest(TestCase):
         tx = Tx.parse(stream)
         self.assertEqual(tx.serialize(), raw_tx)
 
+    def test_parse_large(self):
+        # more than 252 inputs and outputs and a scriptSig longer than 252
+        # bytes all need multi-byte varints
+        script_sig = b''.join(bytes([75]) + bytes([i]) * 75 for i in range(4))
+        tx_ins = [
+            TxIn(i.to_bytes(32, 'big'), i, script_sig, 0xffffffff)
+            for i in range(300)
+        ]
+        h160 = decode_base58('mzx5YhAH9kNHtcN481u6WkjeHjYtVeKVh2')
+        tx_outs = [TxOut(i, p2pkh_script(h160)) for i in range(260)]
+        raw_tx = Tx(1, tx_ins, tx_outs, 410393).serialize()
+        self.assertEqual(raw_tx[4:7], unhexlify('fd2c01'))
+        # a BytesIO is parsed in place, any other stream field by field
+        for stream in (BytesIO(raw_tx + raw_tx), BufferedReader(BytesIO(raw_tx + raw_tx))):
+            for _ in range(2):
+                tx = Tx.parse(stream)
+                self.assertEqual(len(tx.tx_ins), 300)
+                self.assertEqual(len(tx.tx_outs), 260)
+                self.assertEqual(tx.tx_ins[299].prev_index, 299)
+                self.assertEqual(tx.tx_ins[7].script_sig.serialize(), script_sig)
+                self.assertEqual(tx.tx_outs[259].amount, 259)
+                self.assertEqual(tx.locktime, 410393)
+                self.assertEqual(tx.serialize(), raw_tx)
+            self.assertEqual(stream.read(), b'')
+        tx, offset = Tx.parse_view(memoryview(raw_tx))
+        self.assertEqual(offset, len(raw_tx))
+        with self.assertRaises(RuntimeError):
+            Tx.parse_view(memoryview(raw_tx[:-1]))
+        # cut short anywhere, both parsers raise a RuntimeError
+        raw_tx = unhexlify('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
+        for length in range(len(raw_tx)):
+            with self.assertRaises(RuntimeError):
+                Tx.parse(BytesIO(raw_tx[:length]))
+            with self.assertRaises(RuntimeError):
+                Tx.parse(BufferedReader(BytesIO(raw_tx[:length])))
+
+    def test_lazy_scripts(self):
+        raw_tx = unhexlify('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
+        tx = Tx.parse(BytesIO(raw_tx))
+        tx_in, tx_out = tx.tx_ins[0], tx.tx_outs[0]
+        # nothing is decoded by parsing or serializing
+        self.assertEqual(tx.serialize(), raw_tx)
+        self.assertIsNone(tx_in._script_sig)
+        self.assertIsNone(tx_out._script_pubkey)
+        # decoding happens once and is kept
+        script_sig = tx_in.script_sig
+        self.assertIs(tx_in.script_sig, script_sig)
+        self.assertEqual(tx_out.script_pubkey.type(), 'p2pkh')
+        self.assertEqual(tx.serialize(), raw_tx)
+        # so the decoded scripts can't drift from the raw bytes serialized
+        with self.assertRaises(TypeError):
+            tx_out.script_pubkey.elements[2] = b'\x00' * 20
+        with self.assertRaises(TypeError):
+            script_sig.elements[0] = b''
+        self.assertEqual(tx.serialize(), raw_tx)
+        # a replaced script is what gets serialized
+        tx_out.script_pubkey = Script.parse(p2pkh_script(b'\x00' * 20))
+        tx_in.script_sig = b''
+        self.assertEqual(tx_in.script_sig.elements, ())
+        tx = Tx.parse(BytesIO(tx.serialize()))
+        self.assertEqual(tx.tx_outs[0].script_pubkey.elements[2], b'\x00' * 20)
+        self.assertEqual(tx.tx_ins[0].script_sig.serialize(), b'')
+
+    def test_hash(self):
+        raw_tx = unhexlify('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
+        want = '452c629d67e41baec3ac6f04fe744b4b9617f8f859c63b3002f8684e7a4fee03'
+        tx = Tx.parse(BytesIO(raw_tx))
+        # building objects isn't a mutation, only later assignments are
+        self.assertEqual(tx._mutation_snapshot()[:2], (0, 0))
+        self.assertEqual(tx.id(), want)
+        self.assertIs(tx.hash(), tx.hash())
+        # a stream that isn't a BytesIO has no parsed bytes to hash
+        self.assertEqual(Tx.parse(BufferedReader(BytesIO(raw_tx))).id(), want)
+
+        def fresh_id():
+            return Tx.parse(BytesIO(tx.serialize())).id()
+
+        # every kind of change is picked up
+        tx.tx_ins[0].script_sig = b''
+        self.assertNotEqual(tx.id(), want)
+        self.assertEqual(tx.id(), fresh_id())
+        tx.tx_outs[1].amount += 1
+        self.assertEqual(tx.id(), fresh_id())
+        tx.tx_outs.append(TxOut(1, p2pkh_script(b'\x00' * 20)))
+        self.assertEqual(tx.id(), fresh_id())
+        tx.tx_ins[0] = TxIn(b'\x00' * 32, 0, b'', 0)
+        self.assertEqual(tx.id(), fresh_id())
+        tx.locktime = 0
+        self.assertEqual(tx.id(), fresh_id())
+        # scripts can only change through the setters
+        with self.assertRaises(TypeError):
+            tx.tx_outs[0].script_pubkey.elements[2] = b'\x00' * 20
+        tx.tx_outs[0].script_pubkey = Script.parse(p2pkh_script(b'\x00' * 20))
+        self.assertEqual(tx.id(), fresh_id())
+        # changes to one transaction leave the others' hashes alone
+        other = Tx.parse(BytesIO(raw_tx))
+        hashed = other.hash()
+        tx.tx_outs[1].amount += 1
+        tx.tx_ins[0].script_sig = b''
+        self.assertIs(other.hash(), hashed)
+        self.assertEqual(tx.id(), fresh_id())
+
     def test_input_value(self):
         tx_hash = 'd1c789a9c60383bf715f3f6ad9d14b91fe55f3deb369fe5d9280cb1a01793f81'
         index = 0
@@ -378,6 +1191,59 @@ class TxTest(TestCase):
         want = int('27e0c5994dec7824e56dec6b2fcb342eb7cdb0d0957c2fce9882f715e85d81a6', 16)
         self.assertEqual(tx.hash_to_sign(0, sighash), want)
 
+    def test_sighash_cache(self):
+        prev_tx = unhexlify('0025bc3c0fa8b7eb55b9437fdbd016870d18e0df0ace7bc9864efc38414147c8')
+        tx_ins = [TxIn(prev_tx, 0, b'', sequence) for sequence in range(4)]
+        h160 = decode_base58('mzx5YhAH9kNHtcN481u6WkjeHjYtVeKVh2')
+        tx_outs = [TxOut(1000, p2pkh_script(h160)), TxOut(2000, p2pkh_script(h160))]
+        tx = Tx(1, tx_ins, tx_outs, 7, testnet=True)
+        script_code = tx_ins[0].script_pubkey(testnet=True)
+
+        def full_serialization(input_index):
+            alt_tx_ins = [TxIn(t.prev_tx, t.prev_index, b'', t.sequence) for t in tx_ins]
+            alt_tx_ins[input_index].script_sig = Script.parse(script_code)
+            alt_tx = Tx(tx.version, alt_tx_ins, tx.tx_outs, tx.locktime)
+            result = alt_tx.serialize() + int_to_little_endian(SIGHASH_ALL, 4)
+            return int.from_bytes(double_sha256(result), 'big')
+
+        for i in range(len(tx_ins)):
+            self.assertEqual(tx.hash_to_sign(i, SIGHASH_ALL), full_serialization(i))
+        cache = tx.sighash_cache()
+        # scriptSigs aren't part of the cached serialization
+        tx_ins[1].script_sig = Script.parse(b'\x01\x01')
+        self.assertIs(tx.sighash_cache(), cache)
+        # the fields that are get the cache rebuilt
+        tx_ins[2].sequence = 0xffffffff
+        tx_outs[1].amount = 1500
+        tx.locktime = 8
+        self.assertIsNot(tx.sighash_cache(), cache)
+        for i in range(len(tx_ins)):
+            self.assertEqual(tx.hash_to_sign(i, SIGHASH_ALL), full_serialization(i))
+        # and so do changes made to the lists in place
+        cache = tx.sighash_cache()
+        tx_ins.append(TxIn(prev_tx, 0, b'', 9))
+        self.assertIsNot(tx.sighash_cache(), cache)
+        cache = tx.sighash_cache()
+        tx_outs[0] = TxOut(1000, p2pkh_script(h160))
+        self.assertIsNot(tx.sighash_cache(), cache)
+        for i in range(len(tx_ins)):
+            self.assertEqual(tx.hash_to_sign(i, SIGHASH_ALL), full_serialization(i))
+        # a decoded script can't be edited in place behind the cache, only
+        # replaced through the setter, which is picked up
+        script_pubkey = tx_outs[0].script_pubkey
+        with self.assertRaises(TypeError):
+            script_pubkey.elements[2] = b'\x00' * 20
+        with self.assertRaises(AttributeError):
+            script_pubkey.elements = []
+        z = tx.hash_to_sign(0, SIGHASH_ALL)
+        tx_outs[0].script_pubkey = Script.parse(p2pkh_script(b'\x00' * 20))
+        self.assertNotEqual(tx.hash_to_sign(0, SIGHASH_ALL), z)
+        for i in range(len(tx_ins)):
+            self.assertEqual(tx.hash_to_sign(i, SIGHASH_ALL), full_serialization(i))
+        # a transaction built from tuples keeps its cache too
+        tuple_tx = Tx(1, tuple(tx_ins), tuple(tx_outs), 7, testnet=True)
+        self.assertIs(tuple_tx.sighash_cache(), tuple_tx.sighash_cache())
+
     def test_verify_input1(self):
         raw_tx = unhexlify('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
         stream = BytesIO(raw_tx)
@@ -415,6 +1281,32 @@ class TxTest(TestCase):
         )
         self.assertTrue(tx.sign_input(0, private_key, SIGHASH_ALL))
 
+    def test_verify_all_inputs(self):
+        private_key = PrivateKey(secret=8675309)
+        prev_tx = unhexlify('0025bc3c0fa8b7eb55b9437fdbd016870d18e0df0ace7bc9864efc38414147c8')
+        tx_ins = []
+        for sequence in range(5):
+            tx_ins.append(TxIn(
+                prev_tx=prev_tx,
+                prev_index=0,
+                script_sig=b'',
+                sequence=sequence,
+            ))
+        h160 = decode_base58('mzx5YhAH9kNHtcN481u6WkjeHjYtVeKVh2')
+        tx_outs = [TxOut(amount=1000, script_pubkey=p2pkh_script(h160))]
+        tx = Tx(version=1, tx_ins=tx_ins, tx_outs=tx_outs, locktime=0, testnet=True)
+        for i in range(len(tx_ins)):
+            self.assertTrue(tx.sign_input(i, private_key, SIGHASH_ALL))
+        self.assertEqual(tx.verify_all_inputs(), [True] * 5)
+        self.assertTrue(tx.verify(parallel=2))
+        # a signature moved to another input doesn't match that input's hash
+        tx_ins[3].script_sig = tx_ins[1].script_sig
+        want = [True, True, True, False, True]
+        self.assertEqual(tx.verify_all_inputs(), want)
+        self.assertEqual(tx.verify_all_inputs(parallel=2), want)
+        self.assertFalse(tx.verify())
+        self.assertEqual(verify_transactions([tx, tx], parallel=3), [False, False])
+
     def test_is_coinbase(self):
         raw_tx = unhexlify('01000000010000000000000000000000000000000000000000000000000000000000000000ffffffff5e03d71b07254d696e656420627920416e74506f6f6c20626a31312f4542312f4144362f43205914293101fabe6d6d678e2c8c34afc36896e7d9402824ed38e856676ee94bfdb0c6c4bcd8b2e5666a0400000000000000c7270000a5e00e00ffffffff01faf20b58000000001976a914338c84849423992471bffb1a54a8d9b1d69dc28a88ac00000000')
         stream = BytesIO(raw_tx)